@@ -0,0 +1,390 @@
+"""
+Local mock of the 1688 pages the scrapers visit.
+
+Serves search result pages, product detail pages (with ``window.context`` and
+the ``#cart`` module), captcha walls and missing-product pages, with
+configurable latency and block rates, so end-to-end scrape benchmarks can
+run on a machine with no network.
+
+Routes
+------
+    /selloffer/offer_search.htm?keywords=..&beginPage=N   listing page N
+    /offer/<offer_id>.html                                detail page
+    /location                                             proxy-check stand-in
+    /img/<name>                                           1x1 GIF
+    /__stats                                              JSON request counters
+
+The server also accepts absolute-form request lines, so it can be used as
+the scraper's HTTP proxy for plain ``http://`` targets.
+
+Pointing the scrapers at it (scriping_files/.env)
+-------------------------------------------------
+    PROXY_URL=http://127.0.0.1:8765
+    PROXY_CHECK_URL=http://127.0.0.1:8765/location
+    DETAIL_BASE_URL=http://127.0.0.1:8765
+    SEARCH_BASE_URL=http://127.0.0.1:8765
+
+Usage
+-----
+    python -m benchmarks.mock_1688 --port 8765 --latency-ms 150 --jitter-ms 50 \\
+        --captcha-rate 0.05 --missing-rate 0.02
+"""
+import argparse
+import hashlib
+import html
+import json
+import random
+import threading
+import time
+from functools import partial
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# 1x1 transparent GIF
+PIXEL_GIF = (
+    b'GIF89a\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00\xff\xff\xff!\xf9\x04\x01\x00'
+    b'\x00\x00\x00,\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02D\x01\x00;'
+)
+
+CAPTCHA_PAGE = '''<!doctype html>
+<html><head><meta charset="utf-8"><title>Captcha Interception</title></head>
+<body><div id="nocaptcha">Please slide to verify - captcha</div></body></html>'''
+
+MISSING_PAGE = '''<!doctype html>
+<html><head><meta charset="utf-8"><title>1688</title></head>
+<body><div class="error-page">很抱歉，该商品不存在 - 404 not found</div></body></html>'''
+
+
+class MockOptions:
+    def __init__(self, public_url, latency_ms=0, jitter_ms=0, captcha_rate=0.0,
+                 missing_rate=0.0, pages=5, cards=20, colors=4, sizes=5, seed=None):
+        self.public_url = public_url.rstrip('/')
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.captcha_rate = captcha_rate
+        self.missing_rate = missing_rate
+        self.pages = pages
+        self.cards = cards
+        self.colors = colors
+        self.sizes = sizes
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats: dict[str, int] = {}
+
+    def count(self, key):
+        with self.lock:
+            self.stats[key] = self.stats.get(key, 0) + 1
+
+    def roll(self, rate) -> bool:
+        with self.lock:
+            return self.random.random() < rate
+
+    def delay(self) -> None:
+        with self.lock:
+            jitter = self.random.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0
+        seconds = max(0.0, self.latency_ms + jitter) / 1000
+        if seconds:
+            time.sleep(seconds)
+
+    def is_missing(self, offer_id: str) -> bool:
+        # Deterministic per offer so a product is either always there or never
+        digest = int(hashlib.sha1(offer_id.encode()).hexdigest()[:8], 16)
+        return digest / 0xFFFFFFFF < self.missing_rate
+
+
+# ---------------------------
+# Page builders
+# ---------------------------
+
+def _offer_id(keywords: str, page: int, index: int) -> str:
+    digest = hashlib.sha1(f'{keywords}:{page}:{index}'.encode()).hexdigest()
+    return str(600000000000 + int(digest[:10], 16) % 399999999999)
+
+
+def listing_page(opts: MockOptions, keywords: str, page: int) -> str:
+    rng = random.Random(f'{keywords}:{page}')
+    cards = []
+    for i in range(opts.cards):
+        offer_id = _offer_id(keywords, page, i)
+        amount = rng.randint(5, 5000)
+        ad = ' cardui-adOffer' if i % 7 == 3 else ''
+        cards.append(f'''  <a class="i18n-card-wrap{ad}" href="{opts.public_url}/offer/{offer_id}.html">
+    <img class="main-img" src="{opts.public_url}/img/{offer_id}.jpg">
+    <div class="offer-title">{html.escape(keywords)} item {page}-{i}</div>
+    <div class="price-wrap"><span class="symbol">¥</span><span class="number">{amount}</span><span class="unit">.{rng.randint(0, 99):02d}</span></div>
+    <div class="overseas-price">≈${amount / 6.8:.2f}</div>
+    <div class="star-level-text">{rng.uniform(3.5, 5):.1f}</div>
+    <div class="sale-amount-wrap">{rng.choice([50, 200, 1000, 3000])}+ sold</div>
+    <div class="overseas-begin-quantity-wrap">≥{rng.randint(1, 10)} pieces</div>
+    <img class="overseas-seller-icon" src="{opts.public_url}/img/seller-icon.png">
+  </a>''')
+
+    disabled = ' disabled' if page >= opts.pages else ''
+    next_href = f'?charset=utf8&keywords={html.escape(keywords)}&beginPage={page + 1}'
+    return f'''<!doctype html>
+<html lang="zh-CN"><head><meta charset="utf-8"><title>{html.escape(keywords)} - 1688</title></head>
+<body>
+<div class="search-bar"><input id="alisearch-input" value="{html.escape(keywords)}"></div>
+<div class="offer-list">
+{chr(10).join(cards)}
+</div>
+<div class="fui-paging">
+  <span class="fui-current">{page}</span>
+  <span class="fui-paging-num">{opts.pages}</span>
+  <a class="fui-arrow fui-next{disabled}" href="{next_href}">下一页</a>
+</div>
+</body></html>'''
+
+
+def detail_context(opts: MockOptions, offer_id: str) -> dict:
+    rng = random.Random(offer_id)
+    colors = [f'颜色{c + 1}' for c in range(opts.colors)]
+    sizes = [f'规格{s + 1}' for s in range(opts.sizes)]
+    base_price = rng.randint(10, 3000)
+
+    sku_info = {}
+    for c, color in enumerate(colors):
+        for s, size in enumerate(sizes):
+            key = f'{color}&gt;{size}'
+            sku_info[key] = {
+                'specAttrs':     key,
+                'skuId':         int(offer_id[-6:]) * 100 + c * opts.sizes + s,
+                'specId':        hashlib.md5(f'{offer_id}{key}'.encode()).hexdigest()[:16],
+                'price':         f'{base_price + s * 10:.2f}',
+                'discountPrice': f'{base_price + s * 10:.2f}',
+                'canBookCount':  rng.randint(0, 500),
+                'saleCount':     rng.randint(0, 300),
+            }
+
+    return {'result': {'global': {'globalData': {
+        'model': {
+            'offerDetail': {
+                'offerId':           offer_id,
+                'subject':           f'Mock product {offer_id}',
+                'leafCategoryName':  '测试类目',
+                'featureAttributes': [{'name': '品牌', 'value': 'MOCK'}, {'name': '产地', 'value': '深圳'}],
+            },
+            'tradeModel': {
+                'beginAmount':  rng.randint(1, 10),
+                'saleCount':    rng.randint(0, 5000),
+                'priceDisplay': f'{base_price:.2f}-{base_price + (opts.sizes - 1) * 10:.2f}',
+            },
+        },
+        'skuModel': {
+            'skuProps': [
+                {'prop': '颜色', 'fid': 3216, 'value': [
+                    {'name': color, 'imageUrl': f'{opts.public_url}/img/{offer_id}-{i}.jpg'}
+                    for i, color in enumerate(colors)
+                ]},
+                {'prop': '规格', 'fid': 1234, 'value': [{'name': size} for size in sizes]},
+            ],
+            'skuInfoMap': sku_info,
+        },
+    }}}}
+
+
+def detail_page(opts: MockOptions, offer_id: str) -> str:
+    context = detail_context(opts, offer_id)
+    global_data = context['result']['global']['globalData']
+    offer = global_data['model']['offerDetail']
+    sku_props = global_data['skuModel']['skuProps']
+    sku_info = global_data['skuModel']['skuInfoMap']
+    first_color = sku_props[0]['value'][0]['name']
+
+    color_buttons = '\n'.join(
+        f'        <button class="sku-filter-button{" active" if i == 0 else ""}">'
+        f'<img src="{v["imageUrl"]}"><span class="label-name">{v["name"]}</span></button>'
+        for i, v in enumerate(sku_props[0]['value'])
+    )
+    size_items = '\n'.join(
+        f'''        <div class="expand-view-item">
+          <span class="item-label">{v["name"]}</span>
+          <span class="item-price-stock">¥{sku_info[f"{first_color}&gt;{v['name']}"]["price"]}</span>
+          <span class="item-price-stock">库存 {sku_info[f"{first_color}&gt;{v['name']}"]["canBookCount"]}</span>
+        </div>'''
+        for v in sku_props[1]['value']
+    )
+    attributes = '\n'.join(
+        f'      <span class="ant-descriptions-item-label">{a["name"]}</span>'
+        f'<span class="ant-descriptions-item-content"><span class="field-value">{a["value"]}</span></span>'
+        for a in offer['featureAttributes']
+    )
+    price_range = global_data['model']['tradeModel']['priceDisplay'].split('-')
+
+    return f'''<!doctype html>
+<html lang="zh-CN">
+<head>
+<meta charset="utf-8">
+<title>{offer["subject"]} - 1688</title>
+<script>
+window.contextPath = "/default";
+window.context = (function (b, a) {{ b.result = a.result; return b; }})(window.context || {{}}, {json.dumps(context, ensure_ascii=False)});
+</script>
+</head>
+<body>
+<div class="breadcrumb"><a href="/">首页</a><a href="/">测试一级类目</a><a href="/">{offer["leafCategoryName"]}</a></div>
+<div id="productTitle">
+  <h1>{offer["subject"]}</h1>
+  <span class="hl">4.7</span><span class="brackets">(12)</span>
+  <div class="trade-info"><em class="hl">4.7</em> 已售 <em class="hl">{global_data["model"]["tradeModel"]["saleCount"]}</em></div>
+</div>
+<div id="productEvaluation">
+  <div class="header-label-desc"><em class="hl">4.7</em> 好评率 <em class="hl">97%</em><span class="brackets" data-value="12">(12)</span></div>
+</div>
+<div id="productAttributes">
+  <div class="ant-descriptions"><div class="ant-descriptions-row">
+{attributes}
+  </div></div>
+</div>
+<div id="productPackInfo"><table><tbody>
+  <tr><td>{first_color}</td><td>30x20x10</td><td>500</td></tr>
+</tbody></table></div>
+<div class="price-indication"><dl class="price-desc"><dt>价格说明</dt><dl>模拟价格说明。</dl></dl></div>
+<div id="description"><img src="{opts.public_url}/img/{offer_id}-desc-1.jpg"><img src="{opts.public_url}/img/{offer_id}-desc-2.jpg"></div>
+<div id="cart" data-module="od_cart_sider" data-spm="cart">
+  <div id="cartScrollBar">
+    <div id="mainPrice"><div class="price-info"><span>¥</span><span>{price_range[0]}</span><span>-</span><span>{price_range[-1]}</span></div></div>
+    <div id="mainServices"><a class="service-item-link">48小时发货</a></div>
+    <div id="shippingServices"><span class="location">广东 深圳</span></div>
+    <div id="skuSelection">
+      <div class="transverse-filter">
+{color_buttons}
+      </div>
+      <div class="expand-view-list">
+{size_items}
+      </div>
+    </div>
+  </div>
+</div>
+</body>
+</html>'''
+
+
+# ---------------------------
+# HTTP handler
+# ---------------------------
+
+class Mock1688Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def __init__(self, *args, options: MockOptions, **kwargs):
+        self.options = options
+        super().__init__(*args, **kwargs)
+
+    def do_CONNECT(self):
+        # HTTPS tunnelling would need a MITM certificate; targets must be http://
+        self._send(405, 'text/plain', b'mock_1688 only proxies plain http:// targets')
+
+    def do_GET(self):
+        opts = self.options
+        url = urlparse(self.path)
+        path, query = url.path, parse_qs(url.query)
+
+        if path == '/__stats':
+            with opts.lock:
+                body = json.dumps(opts.stats).encode()
+            self._send(200, 'application/json', body)
+            return
+
+        if path.startswith('/img/'):
+            opts.count('image')
+            self._send(200, 'image/gif', PIXEL_GIF)
+            return
+
+        opts.delay()
+
+        if path == '/location':
+            opts.count('location')
+            self._send(200, 'application/json', b'{"ip": "127.0.0.1", "country": "CN", "city": "mock"}')
+            return
+
+        if path.endswith('/offer_search.htm'):
+            if opts.roll(opts.captcha_rate):
+                return self._captcha()
+            keywords = query.get('keywords', [''])[0]
+            try:
+                page = max(1, int(query.get('beginPage', ['1'])[0]))
+            except ValueError:
+                page = 1
+            if page > opts.pages:
+                return self._missing()
+            opts.count('listing')
+            self._send(200, 'text/html; charset=utf-8', listing_page(opts, keywords, page).encode('utf-8'))
+            return
+
+        if path.startswith('/offer/') and path.endswith('.html'):
+            offer_id = path[len('/offer/'):-len('.html')]
+            if not offer_id.isdigit() or opts.is_missing(offer_id):
+                return self._missing()
+            if opts.roll(opts.captcha_rate):
+                return self._captcha()
+            opts.count('detail')
+            self._send(200, 'text/html; charset=utf-8', detail_page(opts, offer_id).encode('utf-8'))
+            return
+
+        self._missing()
+
+    def _captcha(self):
+        self.options.count('captcha')
+        self._send(200, 'text/html; charset=utf-8', CAPTCHA_PAGE.encode('utf-8'))
+
+    def _missing(self):
+        self.options.count('missing')
+        self._send(404, 'text/html; charset=utf-8', MISSING_PAGE.encode('utf-8'))
+
+    def _send(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_mock_server(host='127.0.0.1', port=0, **options):
+    """Start the mock in a daemon thread and return ``(server, base_url)``."""
+    server = ThreadingHTTPServer((host, port), None)
+    base_url = f'http://{host}:{server.server_address[1]}'
+    opts = MockOptions(options.pop('public_url', None) or base_url, **options)
+    server.RequestHandlerClass = partial(Mock1688Handler, options=opts)
+    server.options = opts
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, base_url
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description='Serve mock 1688 search, detail, captcha and 404 pages.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--public-url', help='base URL written into links (default: http://host:port)')
+    parser.add_argument('--latency-ms', type=float, default=0)
+    parser.add_argument('--jitter-ms', type=float, default=0)
+    parser.add_argument('--captcha-rate', type=float, default=0.0, help='fraction of page loads answered with a captcha wall')
+    parser.add_argument('--missing-rate', type=float, default=0.0, help='fraction of offer ids that return 404')
+    parser.add_argument('--pages', type=int, default=5, help='search result pages per keyword')
+    parser.add_argument('--cards', type=int, default=20, help='cards per search result page')
+    parser.add_argument('--colors', type=int, default=4, help='colour variants per product')
+    parser.add_argument('--sizes', type=int, default=5, help='sizes per colour')
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args(argv)
+
+    server, base_url = start_mock_server(
+        args.host, args.port,
+        public_url=args.public_url,
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+        captcha_rate=args.captcha_rate, missing_rate=args.missing_rate,
+        pages=args.pages, cards=args.cards, colors=args.colors, sizes=args.sizes,
+        seed=args.seed,
+    )
+    print(f'Mock 1688 listening on {base_url} (Ctrl+C to stop)')
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
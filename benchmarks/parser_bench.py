@@ -0,0 +1,262 @@
+"""
+Offline parser benchmark.
+
+Replays saved listing and detail HTML through the scraper's parsers with a
+local static server standing in for 1688, and reports per-stage timings and
+throughput.  No proxy, cookies or live session are needed.
+
+Usage
+-----
+    python -m benchmarks.parser_bench
+    python -m benchmarks.parser_bench --repeat 5 --json bench.json
+    python -m benchmarks.parser_bench --min-detail-pps 0.5 --fail-on-error   # CI gate
+
+Fixtures
+--------
+    benchmarks/fixtures/listing/*.html   search result pages (a.i18n-card-wrap cards)
+    benchmarks/fixtures/detail/*.html    rendered product pages incl. window.context
+
+The token ``__HOST__`` inside a fixture is replaced with the address of the
+local server, so image URLs resolve offline.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from types import SimpleNamespace
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+# The scraper modules import `database`, which needs a database name even
+# though the parsers never touch Mongo.
+os.environ.setdefault('MONGO_DB_NAME', 'benchmark')
+
+from playwright.async_api import async_playwright
+
+from scriping_files.scriping_pages import parse_product_card
+from scriping_files.extract_context_json import extract_context_script
+from scriping_files import details_scriping_page as details
+
+FIXTURES_DIR = Path(__file__).resolve().parent / 'fixtures'
+
+# 1x1 transparent GIF served for every /img/ request
+PIXEL_GIF = (
+    b'GIF89a\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00\xff\xff\xff!\xf9\x04\x01\x00'
+    b'\x00\x00\x00,\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02D\x01\x00;'
+)
+
+
+# ---------------------------
+# Local static server
+# ---------------------------
+
+class FixtureHandler(SimpleHTTPRequestHandler):
+    def do_GET(self):
+        path = self.path.split('?', 1)[0]
+
+        if path.startswith('/img/'):
+            self._send(200, 'image/gif', PIXEL_GIF)
+            return
+
+        file_path = Path(self.directory) / path.lstrip('/')
+        if not file_path.is_file():
+            self._send(404, 'text/html; charset=utf-8', b'<html><body>404 not found</body></html>')
+            return
+
+        html = file_path.read_text(encoding='utf-8').replace('__HOST__', self.headers.get('Host', ''))
+        self._send(200, 'text/html; charset=utf-8', html.encode('utf-8'))
+
+    def _send(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_fixture_server(directory: Path):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), partial(FixtureHandler, directory=str(directory)))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_address[1]}'
+
+
+# ---------------------------
+# Timing helpers
+# ---------------------------
+
+class StageStats:
+    def __init__(self):
+        self.samples: dict[str, list[float]] = {}
+        self.errors: dict[str, list[str]] = {}
+
+    async def time(self, stage, coro):
+        start = time.perf_counter()
+        try:
+            return await coro
+        except Exception as exc:
+            self.errors.setdefault(stage, []).append(f'{type(exc).__name__}: {exc}')
+            return None
+        finally:
+            self.samples.setdefault(stage, []).append(time.perf_counter() - start)
+
+    def summary(self) -> dict:
+        result = {}
+        for stage, values in self.samples.items():
+            ordered = sorted(values)
+            p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+            result[stage] = {
+                'runs':     len(values),
+                'errors':   len(self.errors.get(stage, [])),
+                'total_s':  round(sum(values), 4),
+                'mean_ms':  round(statistics.mean(values) * 1000, 2),
+                'p95_ms':   round(p95 * 1000, 2),
+            }
+        return result
+
+
+# ---------------------------
+# Replays
+# ---------------------------
+
+async def bench_listing(page, url, request, stats):
+    await page.goto(url)
+    start = time.perf_counter()
+
+    cards = await page.query_selector_all('a.i18n-card-wrap')
+    for card in cards:
+        await stats.time('parse_product_card', parse_product_card(card, request))
+
+    return time.perf_counter() - start
+
+
+DETAIL_STAGES = [
+    ('extract_product_reviews',        lambda page, req: details.extract_product_reviews(page)),
+    ('extract_product_attributes',     lambda page, req: details.extract_product_attributes(page)),
+    ('extract_product_packing',        lambda page, req: details.extract_product_packing(page)),
+    ('extract_product_description',    lambda page, req: details.extract_product_description(page, req)),
+    ('extract_product_title_and_cart', lambda page, req: details.extract_product_title_and_cart(page, req)),
+    ('extract_product_variants',       lambda page, req: details.extract_product_variants(page, req)),
+    ('extract_categories',             lambda page, req: details.extract_categories(page)),
+    ('extract_product_details_in_page', lambda page, req: details.extract_product_details_in_page(page)),
+    ('parse_product_details',          lambda page, req: details.parse_product_details(page, req)),
+]
+
+
+async def bench_detail(page, url, html, request, stats):
+    await page.goto(url)
+    start = time.perf_counter()
+
+    for stage, run in DETAIL_STAGES:
+        await stats.time(stage, run(page, request))
+
+    await stats.time('extract_context_script', extract_context_script(html))
+
+    return time.perf_counter() - start
+
+
+async def run_benchmark(fixtures_dir: Path, repeat: int) -> dict:
+    listing_files = sorted((fixtures_dir / 'listing').glob('*.html'))
+    detail_files = sorted((fixtures_dir / 'detail').glob('*.html'))
+
+    server, base_url = start_fixture_server(fixtures_dir)
+    stats = StageStats()
+    elapsed = {'listing': 0.0, 'detail': 0.0}
+    pages = {'listing': 0, 'detail': 0}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # get_project_url() prefixes image save dirs with request.base_url
+        request = SimpleNamespace(base_url=f'{tmp}/')
+
+        try:
+            async with async_playwright() as p:
+                browser = await p.chromium.launch(headless=True)
+                page = await browser.new_page()
+
+                for _ in range(repeat):
+                    for path in listing_files:
+                        url = f'{base_url}/listing/{path.name}'
+                        elapsed['listing'] += await bench_listing(page, url, request, stats)
+                        pages['listing'] += 1
+
+                    for path in detail_files:
+                        url = f'{base_url}/detail/{path.name}'
+                        html = path.read_text(encoding='utf-8')
+                        elapsed['detail'] += await bench_detail(page, url, html, request, stats)
+                        pages['detail'] += 1
+
+                await browser.close()
+        finally:
+            server.shutdown()
+
+    return {
+        'stages': stats.summary(),
+        'errors': stats.errors,
+        'throughput': {
+            kind: {
+                'pages':         pages[kind],
+                'total_s':       round(elapsed[kind], 4),
+                'pages_per_sec': round(pages[kind] / elapsed[kind], 2) if elapsed[kind] else None,
+            }
+            for kind in ('listing', 'detail')
+        },
+    }
+
+
+def print_report(report: dict) -> None:
+    print(f"\n{'stage':<34}{'runs':>6}{'errors':>8}{'mean ms':>11}{'p95 ms':>11}{'total s':>10}")
+    print('-' * 80)
+    for stage, s in report['stages'].items():
+        print(f"{stage:<34}{s['runs']:>6}{s['errors']:>8}{s['mean_ms']:>11}{s['p95_ms']:>11}{s['total_s']:>10}")
+
+    print()
+    for kind, t in report['throughput'].items():
+        print(f"{kind:<8} pages: {t['pages']:<5} total: {t['total_s']}s  pages/sec: {t['pages_per_sec']}")
+
+    for stage, messages in report['errors'].items():
+        print(f'\n✗ {stage}: {messages[0]}' + (f' (+{len(messages) - 1} more)' if len(messages) > 1 else ''))
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Benchmark the 1688 parsers against saved HTML fixtures.')
+    parser.add_argument('--fixtures', type=Path, default=FIXTURES_DIR)
+    parser.add_argument('--repeat', type=int, default=3, help='replay every fixture this many times')
+    parser.add_argument('--json', type=Path, help='also write the report to this file')
+    parser.add_argument('--min-listing-pps', type=float, help='fail if listing pages/sec drops below this')
+    parser.add_argument('--min-detail-pps', type=float, help='fail if detail pages/sec drops below this')
+    parser.add_argument('--fail-on-error', action='store_true', help='fail if any parser stage raised')
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(run_benchmark(args.fixtures, args.repeat))
+    print_report(report)
+
+    if args.json:
+        args.json.write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding='utf-8')
+
+    failed = False
+    for kind, minimum in (('listing', args.min_listing_pps), ('detail', args.min_detail_pps)):
+        pps = report['throughput'][kind]['pages_per_sec']
+        if minimum is not None and (pps is None or pps < minimum):
+            print(f'✗ {kind} throughput {pps} pages/sec is below {minimum}')
+            failed = True
+    if args.fail_on_error and report['errors']:
+        print('✗ parser errors detected')
+        failed = True
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,130 @@
+"""
+End-to-end scrape load test against the local 1688 mock.
+
+Starts benchmarks/mock_1688.py in-process (or uses ``--mock-url``), points the
+scraper config at it and drives ``scrape_details_page1688`` or
+``playwright_main`` with the requested concurrency.  Results are written to a
+separate Mongo database (``--db``) so real catalog data is never touched.
+
+Usage
+-----
+    python -m benchmarks.scrape_load details --count 20 --concurrency 4 --latency-ms 150
+    python -m benchmarks.scrape_load listing --keywords laptop phone --concurrency 2
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+from types import SimpleNamespace
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+from benchmarks.mock_1688 import _offer_id, start_mock_server
+
+
+def point_scrapers_at(mock_url: str, db_name: str) -> None:
+    """Must run before any scriping_files module is imported – config is read at import time."""
+    os.environ['PROXY_URL'] = mock_url
+    os.environ['PROXY_CHECK_URL'] = f'{mock_url}/location'
+    os.environ['DETAIL_BASE_URL'] = mock_url
+    os.environ['SEARCH_BASE_URL'] = mock_url
+    os.environ['MONGO_DB_NAME'] = db_name
+
+
+async def run_jobs(jobs, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, failures = [], {}
+
+    async def worker(job):
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await job()
+                latencies.append(time.perf_counter() - start)
+            except Exception as exc:
+                name = type(exc).__name__
+                failures[name] = failures.get(name, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(job) for job in jobs))
+    return time.perf_counter() - start, latencies, failures
+
+
+def mock_stats(mock_url: str) -> dict:
+    try:
+        with urllib.request.urlopen(f'{mock_url}/__stats', timeout=5) as resp:
+            return json.loads(resp.read())
+    except Exception:
+        return {}
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description='Load-test the scrapers against the mock 1688 server.')
+    parser.add_argument('target', choices=['details', 'listing'])
+    parser.add_argument('--count', type=int, default=10, help='detail scrapes to run')
+    parser.add_argument('--keywords', nargs='+', default=['laptop'], help='search keywords for listing runs')
+    parser.add_argument('--concurrency', type=int, default=1)
+    parser.add_argument('--db', default='1688_load_test', help='Mongo database the scrapers write to')
+    parser.add_argument('--mock-url', help='use an already running mock instead of starting one')
+    parser.add_argument('--latency-ms', type=float, default=0)
+    parser.add_argument('--jitter-ms', type=float, default=0)
+    parser.add_argument('--captcha-rate', type=float, default=0.0)
+    parser.add_argument('--missing-rate', type=float, default=0.0)
+    parser.add_argument('--pages', type=int, default=2)
+    args = parser.parse_args(argv)
+
+    server = None
+    mock_url = args.mock_url
+    if not mock_url:
+        server, mock_url = start_mock_server(
+            latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+            captcha_rate=args.captcha_rate, missing_rate=args.missing_rate,
+            pages=args.pages,
+        )
+    point_scrapers_at(mock_url.rstrip('/'), args.db)
+
+    import scriping_files.config  # noqa: F401  – freeze config before .env overrides
+    from scriping_files.scraper import scrape_details_page1688
+    from scriping_files.scriping_pages import playwright_main
+
+    with tempfile.TemporaryDirectory() as tmp:
+        request = SimpleNamespace(base_url=f'{tmp}/')
+
+        if args.target == 'details':
+            ids = [_offer_id('load', 1, i) for i in range(args.count)]
+            jobs = [lambda pid=pid: scrape_details_page1688(pid, request) for pid in ids]
+        else:
+            jobs = [lambda kw=kw: playwright_main(kw, request) for kw in args.keywords]
+
+        elapsed, latencies, failures = asyncio.run(run_jobs(jobs, args.concurrency))
+
+    stats = mock_stats(mock_url)
+    if server:
+        server.shutdown()
+
+    print(f"\n{'=' * 50}")
+    print(f'Target:       {args.target} (concurrency {args.concurrency})')
+    print(f'Jobs:         {len(jobs)}  ok: {len(latencies)}  failed: {sum(failures.values())}')
+    print(f'Elapsed:      {elapsed:.2f}s  → {len(latencies) / elapsed:.2f} ok jobs/sec')
+    if latencies:
+        ordered = sorted(latencies)
+        print(f'Latency:      mean {statistics.mean(latencies):.2f}s  '
+              f'p95 {ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]:.2f}s')
+    if args.target == 'listing' and stats.get('listing'):
+        print(f"Listing pages served: {stats['listing']} → {stats['listing'] / elapsed:.2f} pages/sec")
+    for name, n in failures.items():
+        print(f'Failure:      {name} × {n}')
+    print(f'Mock stats:   {stats}')
+    print(f"{'=' * 50}")
+
+
+if __name__ == '__main__':
+    main()
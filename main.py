@@ -1,6 +1,8 @@
 
 import os
 import sys
+import asyncio
+from contextlib import asynccontextmanager
 from database import db
 
 from fastapi.staticfiles import StaticFiles
@@ -16,6 +18,16 @@ from routers.products import router as product_router
 from routers.categories import router as categories_router
 from routers.subscription import router as subscription_router
 
+from scriping_files.config import USE_PAGE_POOL
+from scriping_files.page_pool import page_pool
+from utils.cache import clear_all_caches
+from utils.metering import api_hit_buffer
+from utils.passwords import password_pool
+from utils.invoice_pdf import invoice_renderer
+from utils.indexes import INDEXES_ON_STARTUP, apply_indexes
+from utils.quota import quota_engine
+from utils.rate_limit import RateLimitMiddleware, rate_limiter
+
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -32,14 +44,43 @@ if not os.path.exists(upload_dir):
     os.makedirs(upload_dir)
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm the scraper page pool in the background so startup is not delayed
+    if USE_PAGE_POOL:
+        page_pool.start()
+    # Index builds can take a while on big collections; don't block startup
+    indexes_task = asyncio.create_task(apply_indexes()) if INDEXES_ON_STARTUP else None
+    api_hit_buffer.start()
+    quota_engine.start()
+    rate_limiter.start()
+
+    yield
+
+    if indexes_task is not None and not indexes_task.done():
+        indexes_task.cancel()
+
+    # Flush buffered API hits and quota usage before the worker exits
+    await api_hit_buffer.stop()
+    await quota_engine.stop()
+    await rate_limiter.stop()
+    password_pool.shutdown()
+    invoice_renderer.shutdown()
+    if USE_PAGE_POOL:
+        await page_pool.close()
+
+
 # Initialize App
-app = FastAPI(title="FastAPI Mongo Admin Panel")
+app = FastAPI(title="FastAPI Mongo Admin Panel", lifespan=lifespan)
 
 # --- 2. Database Dependency ---
 async def get_database():
     return db
 
 # --- 3. Middleware Configuration ---
+# Added first so CORS headers still reach rate limited (429) responses
+app.add_middleware(RateLimitMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=[
@@ -70,6 +111,12 @@ async def admin_auth_middleware(request: Request, call_next):
                 return RedirectResponse(url="/login")
             return Response(content="Unauthorized", status_code=401)
 
+        # Admin edits (disabling users, revoking keys, ...) bypass the routers,
+        # so drop every in-process cache once the write has gone through
+        if request.method in ("POST", "PUT", "PATCH", "DELETE"):
+            response = await call_next(request)
+            clear_all_caches()
+            return response
 
     return await call_next(request)
 
@@ -99,6 +146,11 @@ async def login_logic(password: str = Form(...)):
         return response
     return HTMLResponse("Invalid Token. <a href='/login'>Try again</a>", status_code=401)
 
+# Declared before the admin router so it is not taken for a collection name
+@app.get("/admin/metrics")
+async def admin_metrics():
+    return {"password_pool": password_pool.stats()}
+
 # --- 5. Mount Admin & Include Routers ---
 # Mount the admin application (Handles UI and Admin API)
 mount_admin_app(
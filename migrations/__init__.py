@@ -0,0 +1,26 @@
+"""
+Versioned, resumable data migrations.
+
+    python -m migrations status
+    python -m migrations run                       # every pending migration
+    python -m migrations run 0001 --partitions 8 --batch-size 2000
+
+Checkpoints live in the ``migrations`` collection; see migrations.runner.
+"""
+from migrations import (
+    m0001_price_float,
+    m0002_numeric_fields,
+    m0003_product_details,
+    m0004_payment_transaction_id,
+    m0005_api_hits_dedupe,
+)
+
+
+# In the order they must run
+MIGRATIONS = [
+    m0001_price_float.migration,
+    m0002_numeric_fields.migration,
+    m0003_product_details.migration,
+    m0004_payment_transaction_id.migration,
+    m0005_api_hits_dedupe.migration,
+]
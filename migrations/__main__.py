@@ -0,0 +1,48 @@
+import sys
+import asyncio
+import argparse
+
+from migrations import MIGRATIONS
+from migrations.runner import checkpoints, pending, run_migration
+
+
+async def show_status() -> None:
+    states = {doc["_id"]: doc async for doc in checkpoints.find({})}
+    for migration in MIGRATIONS:
+        state = states.get(migration.version, {})
+        parts = state.get("partitions", {}).values()
+        processed = sum(part.get("processed", 0) for part in parts)
+        print(f"{migration!s:<30} {state.get('status', 'pending'):<10} processed: {processed}")
+
+
+async def run(versions: list[str], partitions: int, batch_size: int) -> None:
+    selected = [m for m in MIGRATIONS if m.version in versions] if versions else await pending(MIGRATIONS)
+    if not selected:
+        print("Nothing to migrate")
+        return
+
+    for migration in selected:
+        print(f"[{migration}] running")
+        applied = await run_migration(migration, partitions=partitions, batch_size=batch_size)
+        print(f"[{migration}] {'done' if applied else 'already applied'}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m migrations", description="Run data migrations.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("status")
+    run_parser = sub.add_parser("run")
+    run_parser.add_argument("versions", nargs="*", help="only these versions (default: every pending one)")
+    run_parser.add_argument("--partitions", type=int, default=4, help="parallel _id ranges per migration")
+    run_parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    if args.command == "status":
+        asyncio.run(show_status())
+    else:
+        asyncio.run(run(args.versions, args.partitions, args.batch_size))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,33 @@
+from migrations.runner import Migration
+
+
+class PriceFloat(Migration):
+    """
+    Numeric ``price_float`` from ``price.amount`` + ``price.unit``
+    (e.g. "12" + ".80" -> 12.8), computed server-side.  Products without
+    an amount are left alone rather than priced at 0.
+    Replaces run_once_migration.py.
+    """
+
+    version = "0001"
+    name = "price_float"
+    collection = "products"
+    filter = {"price.amount": {"$nin": [None, ""]}}
+    pipeline = [
+        {"$set": {"price_float": {"$ifNull": [
+            {"$convert": {
+                "input": {"$concat": [
+                    {"$toString": "$price.amount"},
+                    {"$toString": {"$ifNull": ["$price.unit", ""]}},
+                ]},
+                "to": "double",
+                "onError": None,
+                "onNull": None,
+            }},
+            # Unparseable prices keep whatever they had
+            "$price_float",
+        ]}}},
+    ]
+
+
+migration = PriceFloat()
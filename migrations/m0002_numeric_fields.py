@@ -0,0 +1,27 @@
+from migrations.runner import Migration
+from scriping_files.normalize import normalize_listing
+
+
+class NumericFields(Migration):
+    """
+    Backfill price_float, rating_num, sold_count and moq_num on products
+    scraped before normalization ran at ingest.  The text parsing lives in
+    Python, so updates go out through bulk_write.
+    """
+
+    version = "0002"
+    name = "numeric_fields"
+    collection = "products"
+    filter = {"$or": [
+        {"rating_num": {"$exists": False}},
+        {"sold_count": {"$exists": False}},
+        {"moq_num": {"$exists": False}},
+    ]}
+    projection = {"price": 1, "rating": 1, "sold": 1, "moq": 1}
+
+    def transform(self, doc: dict) -> dict | None:
+        numeric = normalize_listing(doc)
+        return {"$set": numeric} if numeric else None
+
+
+migration = NumericFields()
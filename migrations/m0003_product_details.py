@@ -0,0 +1,32 @@
+from migrations.runner import Migration
+
+
+class ProductDetails(Migration):
+    """
+    Move the embedded ``details`` blob and its section hashes out of
+    ``products`` into ``product_details``, keyed by offer_id.
+
+    ``$merge`` needs the unique product_details.offer_id index, so run
+    ``python -m utils.indexes apply`` first.  A rerun keeps any details
+    the scraper has written since.
+    """
+
+    version = "0003"
+    name = "product_details"
+    collection = "products"
+    filter = {"details": {"$exists": True}, "offer_id": {"$type": "string"}}
+    copy_pipeline = [
+        {"$project": {"_id": 0, "offer_id": 1, "details": 1, "details_hashes": 1, "last_changed_at": 1}},
+        {"$merge": {
+            "into": "product_details",
+            "on": "offer_id",
+            "whenMatched": "keepExisting",
+            "whenNotMatched": "insert",
+        }},
+    ]
+    pipeline = [
+        {"$unset": ["details", "details_hashes"]},
+    ]
+
+
+migration = ProductDetails()
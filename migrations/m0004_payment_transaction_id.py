@@ -0,0 +1,20 @@
+from migrations.runner import Migration
+
+
+class PaymentTransactionId(Migration):
+    """
+    bKash payments were created with the literal placeholder
+    ``"transaction_id"``, which blocks the unique transaction_id index.
+    Pending payments now store null; clear the old placeholders to match.
+    """
+
+    version = "0004"
+    name = "payment_transaction_id"
+    collection = "payment_subscribe_invoices"
+    filter = {"transaction_id": "transaction_id"}
+    pipeline = [
+        {"$set": {"transaction_id": None}},
+    ]
+
+
+migration = PaymentTransactionId()
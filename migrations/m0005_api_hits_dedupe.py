@@ -0,0 +1,70 @@
+from pymongo import DeleteMany, UpdateOne
+
+from migrations.runner import Migration
+
+
+class ApiHitsDedupe(Migration):
+    """
+    Concurrent first hits used to upsert several ``api_hits`` counters for
+    one (user_id, endpoint), which blocks the unique index on the pair.
+    Fold each group into its oldest document, summing ``total_hits``, and
+    delete the rest; run ``python -m utils.indexes apply`` afterwards.
+
+    The oldest document records the ids it has absorbed in ``merged_from``
+    until the others are gone, so a batch replayed after a crash does not
+    count them twice.  Run it with the API stopped: hits flushed into a
+    duplicate while it is being merged would be lost.
+    """
+
+    version = "0005"
+    name = "api_hits_dedupe"
+    collection = "api_hits"
+    filter = {}
+    projection = {"user_id": 1, "endpoint": 1}
+
+    async def apply(self, collection, batch_query: dict, batch: list[dict]) -> None:
+        pairs = {(doc.get("user_id"), doc.get("endpoint")) for doc in batch}
+        groups = await collection.aggregate([
+            {"$match": {"$or": [{"user_id": user_id, "endpoint": endpoint} for user_id, endpoint in pairs]}},
+            {"$sort": {"_id": 1}},
+            {"$group": {
+                "_id": {"user_id": "$user_id", "endpoint": "$endpoint"},
+                "docs": {"$push": "$$ROOT"},
+            }},
+            {"$match": {"docs.1": {"$exists": True}}},
+        ]).to_list(length=None)
+
+        # A group is merged by the batch holding its oldest document, so
+        # partitions never fold the same group in concurrently
+        batch_ids = {doc["_id"] for doc in batch}
+
+        ops = []
+        for group in groups:
+            keep, *others = group["docs"]
+            if keep["_id"] not in batch_ids:
+                continue
+            merged = set(keep.get("merged_from") or [])
+            fresh = [doc for doc in others if doc["_id"] not in merged]
+
+            if fresh:
+                created = [doc["created_at"] for doc in group["docs"] if doc.get("created_at")]
+                updated = [doc["updated_at"] for doc in group["docs"] if doc.get("updated_at")]
+                update = {
+                    "$inc": {"total_hits": sum(doc.get("total_hits") or 0 for doc in fresh)},
+                    "$addToSet": {"merged_from": {"$each": [doc["_id"] for doc in fresh]}},
+                }
+                if created:
+                    update["$min"] = {"created_at": min(created)}
+                if updated:
+                    update["$max"] = {"updated_at": max(updated)}
+                ops.append(UpdateOne({"_id": keep["_id"]}, update))
+
+            ops.append(DeleteMany({"_id": {"$in": [doc["_id"] for doc in others]}}))
+            ops.append(UpdateOne({"_id": keep["_id"]}, {"$unset": {"merged_from": ""}}))
+
+        if ops:
+            # Ordered: a group's counts are folded in before its duplicates go
+            await collection.bulk_write(ops, ordered=True)
+
+
+migration = ApiHitsDedupe()
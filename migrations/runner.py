@@ -0,0 +1,193 @@
+import time
+import asyncio
+from datetime import datetime
+
+from pymongo import UpdateOne
+
+from database import db
+
+
+# One checkpoint document per migration version
+checkpoints = db.migrations
+
+
+class Migration:
+    """
+    A versioned, resumable data migration.
+
+    Subclasses set ``collection`` and ``filter`` and either
+
+    - ``pipeline``: an aggregation-pipeline update run server-side with
+      ``update_many`` over each batch of ``_id``s, or
+    - ``transform(doc)``: returns the update for one document (or None),
+      sent in batches with ``bulk_write``.
+
+    An optional ``copy_pipeline`` runs as an aggregation over each batch
+    before it is updated, e.g. ending in ``$merge`` to move fields into
+    another collection.  Migrations whose writes fit neither shape
+    override ``apply``.
+
+    Batches are keyed on ``_id`` ranges and checkpointed after each write,
+    so a rerun continues where the last one stopped.  Updates must be
+    idempotent: the batch in flight during a crash is applied again.
+    """
+
+    version: str = ""
+    name: str = ""
+    collection: str = ""
+    filter: dict = {}
+    projection: dict | None = None
+    pipeline: list | None = None
+    copy_pipeline: list | None = None
+    # Subclasses that update per document define ``transform(self, doc) -> dict | None``
+    transform = None
+
+    def __init__(self):
+        # Caught at import, before a misdeclared migration writes a checkpoint
+        if type(self).apply is Migration.apply and (self.pipeline is None) == (self.transform is None):
+            raise TypeError(f"{type(self).__name__} must set exactly one of pipeline or transform, or override apply")
+
+    async def apply(self, collection, batch_query: dict, batch: list[dict]) -> None:
+        """Write one batch; ``batch_query`` matches exactly the documents in ``batch``."""
+        if self.pipeline is not None:
+            await collection.update_many(batch_query, self.pipeline)
+            return
+
+        ops = []
+        for doc in batch:
+            update = self.transform(doc)
+            if update:
+                ops.append(UpdateOne({"_id": doc["_id"]}, update))
+        if ops:
+            await collection.bulk_write(ops, ordered=False)
+
+    def __str__(self) -> str:
+        return f"{self.version}_{self.name}"
+
+
+async def _partitions(collection, query: dict, count: int) -> list[dict]:
+    """Split the matching ``_id`` space into ``count`` ranges with $bucketAuto."""
+    if count <= 1:
+        return [{"lower": None, "upper": None}]
+
+    buckets = await collection.aggregate([
+        {"$match": query},
+        {"$bucketAuto": {"groupBy": "$_id", "buckets": count}},
+    ]).to_list(length=None)
+
+    bounds = [bucket["_id"]["min"] for bucket in buckets][1:]
+    lowers = [None, *bounds]
+    uppers = [*bounds, None]
+    return [{"lower": lower, "upper": upper} for lower, upper in zip(lowers, uppers)]
+
+
+class Progress:
+    def __init__(self, label: str, total: int, every: float = 5.0):
+        self.label = label
+        self.total = total
+        self.every = every
+        self.done = 0
+        self.started = time.monotonic()
+        self._last_print = 0.0
+
+    def add(self, count: int, force: bool = False) -> None:
+        self.done += count
+        now = time.monotonic()
+        if force or now - self._last_print >= self.every:
+            self._last_print = now
+            elapsed = now - self.started
+            rate = self.done / elapsed if elapsed else 0
+            percent = f"{self.done / self.total:.1%}" if self.total else "-"
+            print(f"[{self.label}] {self.done}/{self.total} ({percent}) {rate:,.0f} docs/s")
+
+
+async def _run_partition(migration: Migration, collection, index: int, part: dict, batch_size: int, progress: Progress) -> None:
+    key = f"partitions.{index}"
+    last_id = part.get("last_id")
+
+    while True:
+        id_range = {}
+        if last_id is not None:
+            id_range["$gt"] = last_id
+        elif part["lower"] is not None:
+            id_range["$gte"] = part["lower"]
+        if part["upper"] is not None:
+            id_range["$lt"] = part["upper"]
+
+        query = dict(migration.filter)
+        if id_range:
+            query["_id"] = id_range
+
+        projection = {"_id": 1} if migration.pipeline is not None else migration.projection
+        batch = await collection.find(query, projection=projection).sort("_id", 1).limit(batch_size).to_list(length=batch_size)
+        if not batch:
+            break
+
+        first_id, last_id = batch[0]["_id"], batch[-1]["_id"]
+        batch_query = {**migration.filter, "_id": {"$gte": first_id, "$lte": last_id}}
+        if migration.copy_pipeline is not None:
+            await collection.aggregate([{"$match": batch_query}, *migration.copy_pipeline]).to_list(length=None)
+
+        await migration.apply(collection, batch_query, batch)
+
+        await checkpoints.update_one(
+            {"_id": migration.version},
+            {"$set": {f"{key}.last_id": last_id, "updated_at": datetime.utcnow()},
+             "$inc": {f"{key}.processed": len(batch)}},
+        )
+        progress.add(len(batch))
+
+        if len(batch) < batch_size:
+            break
+
+    await checkpoints.update_one({"_id": migration.version}, {"$set": {f"{key}.done": True}})
+
+
+async def run_migration(migration: Migration, partitions: int = 4, batch_size: int = 1000, database=db) -> bool:
+    """Run (or resume) one migration.  Returns False if it was already applied."""
+    checkpoint = await checkpoints.find_one({"_id": migration.version})
+    if checkpoint and checkpoint.get("status") == "done":
+        return False
+
+    collection = database[migration.collection]
+
+    if checkpoint is None or not checkpoint.get("partitions"):
+        parts = await _partitions(collection, migration.filter, partitions)
+        checkpoint = {
+            "_id": migration.version,
+            "name": migration.name,
+            "collection": migration.collection,
+            "status": "running",
+            "partitions": {str(i): {**part, "processed": 0, "done": False} for i, part in enumerate(parts)},
+            "started_at": datetime.utcnow(),
+        }
+        await checkpoints.replace_one({"_id": migration.version}, checkpoint, upsert=True)
+    else:
+        print(f"[{migration}] resuming from checkpoint")
+        await checkpoints.update_one({"_id": migration.version}, {"$set": {"status": "running"}})
+
+    total = await collection.count_documents(migration.filter)
+    progress = Progress(str(migration), total)
+    progress.done = sum(part.get("processed", 0) for part in checkpoint["partitions"].values())
+
+    try:
+        await asyncio.gather(*[
+            _run_partition(migration, collection, int(index), part, batch_size, progress)
+            for index, part in checkpoint["partitions"].items()
+            if not part.get("done")
+        ])
+    except Exception:
+        await checkpoints.update_one({"_id": migration.version}, {"$set": {"status": "failed"}})
+        raise
+
+    await checkpoints.update_one(
+        {"_id": migration.version},
+        {"$set": {"status": "done", "finished_at": datetime.utcnow()}},
+    )
+    progress.add(0, force=True)
+    return True
+
+
+async def pending(registry: list[Migration]) -> list[Migration]:
+    applied = {doc["_id"] async for doc in checkpoints.find({"status": "done"}, projection={"_id": 1})}
+    return [migration for migration in registry if migration.version not in applied]
@@ -1,8 +1,9 @@
 
 
 
+import os
 from bson import ObjectId
-from datetime import datetime
+from datetime import datetime, timezone
 import fastapi.encoders
 import math
 from typing import Annotated
@@ -12,6 +13,7 @@ from fastapi import APIRouter, Depends, HTTPException, status, Request, Query
 from database import db
 from models.invoice import SubscribeInvoiceRequest
 from utils import users as user_utils
+from utils import subscription as subscription_utils
 from models import users as users_models
 from models.invoice import SubscribeInvoiceRequest
 
@@ -89,34 +91,10 @@ async def get_user_invoices(
     skip = (page - 1) * limit
     query = {"user_id": user_id}
 
-    # 1. Get total count
-    total = await db.subscription_invoices.count_documents(query)
-
-    # 2. Fetch documents
-    cursor = db.subscription_invoices.find(query).sort("_id", -1).skip(skip).limit(limit)
-
-    invoices = []
-    async for doc in cursor:
-        # --- THE FIX STARTS HERE ---
-        # Convert the main ID
-        doc["id"] = str(doc.pop("_id"))
-
-        package_id = doc.get("package_id")
-        if package_id:
-            package_data = await db.subscription_package.find_one({"_id": ObjectId(package_id)})
-            if package_data:
-                # Convert package ObjectIds to strings
-                package_data["_id"] = str(package_data["_id"])
-                # Append the package object to the invoice document
-                doc["package"] = package_data
-
-        # Convert any other ObjectIds found in the document keys
-        for key, value in doc.items():
-            if isinstance(value, ObjectId):
-                doc[key] = str(value)
-        # --- THE FIX ENDS HERE ---
-
-        invoices.append(doc)
+    # Count, page and package join in one round trip
+    total, invoices = await subscription_utils.paginate_with_packages(
+        db.subscription_invoices, query, skip, limit
+    )
 
     return {
         "page": page,
@@ -159,31 +137,7 @@ async def get_packages_with_features():
     """
     Returns all subscription packages along with their features.
     """
-
-    packages_cursor = db.subscription_package.find({})
-    packages = await packages_cursor.to_list(length=None)
-
-    result = []
-
-    for package in packages:
-        package_id = package["_id"]
-
-        features = await db.subscription_features.find_one({"package_id": package_id})
-
-        # Convert ObjectIds to strings for JSON serialization
-        package["_id"] = str(package["_id"])
-        features_dict = {}
-        if features:
-            features_dict = {k: v for k, v in features.items() if k not in ["_id", "package_id"]}
-            features_dict["package_id"] = str(features["package_id"])
-            features_dict["_id"] = str(features["_id"])
-
-        result.append({
-            "package": package,
-            "features": features_dict
-        })
-
-    return result
+    return await subscription_utils.get_packages_with_features()
 
 
 from fastapi.encoders import jsonable_encoder
@@ -240,20 +194,15 @@ async def generate_invoice_pdf(
         raise HTTPException(status_code=500, detail=f"Failed to fetch: {str(e)}")
 
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Header, Response
 from fastapi.responses import StreamingResponse
-from fastapi.templating import Jinja2Templates
 from pydantic import BaseModel
-from weasyprint import HTML
-from io import BytesIO
 from datetime import datetime
-import jinja2
-
 
-# app.mount("/static", StaticFiles(directory="static"), name="static")
+from utils import invoice_pdf
 
 
-templates = Jinja2Templates(directory="templates")
+# app.mount("/static", StaticFiles(directory="static"), name="static")
 
 
 
@@ -265,32 +214,107 @@ async def generate_invoice_pdf(
         users_models.User,
         Depends(user_utils.get_current_active_user)
     ],
+    if_none_match: Annotated[str | None, Header()] = None,
 ):
     try:
         user_id = ObjectId(current_user["_id"])
         invoice = await db.subscription_invoices.find_one(
             {"_id": ObjectId(invoice_id), "user_id": user_id}
         )
-        user = await db.User.find_one({"_id": user_id})
+        if not invoice:
+            raise HTTPException(status_code=404, detail="Invoice not found")
+
+        user = await db.User.find_one({"_id": user_id}, projection={"password": 0})
         package_data = await db.subscription_package.find_one({"_id": ObjectId(invoice["package_id"])})
 
-        html_content = templates.get_template("invoice.html").render(
-            invoice=invoice,
-            user=user,
-            package_data=package_data
-        )
+        # The PDF is a pure function of these documents, so their hash is the ETag
+        key = invoice_pdf.invoice_key(invoice, user, package_data)
+        etag = f'"{key}"'
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+        if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+            return Response(status_code=304, headers=headers)
 
-        pdf_bytes = HTML(string=html_content).write_pdf()
+        _, pdf_bytes = await invoice_pdf.invoice_renderer.render(invoice, user, package_data, key=key)
 
         filename = f"invoice-{invoice['invoice_number']}.pdf"
+        headers["Content-Disposition"] = f"attachment; filename={filename}"
 
-        return StreamingResponse(
-            BytesIO(pdf_bytes),
-            media_type="application/pdf",
-            headers={
-                "Content-Disposition": f"attachment; filename={filename}"
-            }
-        )
+        return Response(content=pdf_bytes, media_type="application/pdf", headers=headers)
 
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"PDF generation failed: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"PDF generation failed: {str(e)}")
+
+
+
+INVOICE_EXPORT_MAX = int(os.getenv("INVOICE_EXPORT_MAX", 1000))
+
+
+@router.get("/export/")
+async def export_invoices_zip(
+    current_user: Annotated[
+        users_models.User,
+        Depends(user_utils.get_current_active_user)
+    ],
+    ids:   Annotated[list[str] | None, Query()] = None,
+    start: Annotated[datetime | None, Query()] = None,
+    end:   Annotated[datetime | None, Query()] = None,
+):
+    """
+    Streams the user's invoices as a ZIP of PDFs, selected by ``ids``
+    and/or a ``created_at`` range.  Cached renders are reused; selections
+    over INVOICE_EXPORT_MAX are rejected with 413.
+    """
+    user_id = ObjectId(current_user["_id"])
+    query = {"user_id": user_id}
+
+    if ids:
+        if not all(ObjectId.is_valid(invoice_id) for invoice_id in ids):
+            raise HTTPException(status_code=400, detail="Invalid invoice id")
+        query["_id"] = {"$in": [ObjectId(invoice_id) for invoice_id in ids]}
+
+    # created_at is stored as naive UTC
+    created_at = {}
+    if start is not None:
+        created_at["$gte"] = start.astimezone(timezone.utc).replace(tzinfo=None) if start.tzinfo else start
+    if end is not None:
+        created_at["$lte"] = end.astimezone(timezone.utc).replace(tzinfo=None) if end.tzinfo else end
+    if created_at:
+        query["created_at"] = created_at
+
+    # Refuse rather than silently cut the ZIP short
+    matched = await db.subscription_invoices.count_documents(query, limit=INVOICE_EXPORT_MAX + 1)
+    if matched > INVOICE_EXPORT_MAX:
+        raise HTTPException(
+            status_code=413,
+            detail=f"More than {INVOICE_EXPORT_MAX} invoices match; narrow the ids or date range",
+        )
+
+    user = await db.User.find_one({"_id": user_id}, projection={"password": 0})
+
+    # Packages are few; resolve them once instead of per invoice
+    package_ids = await db.subscription_invoices.distinct("package_id", query)
+    package_ids = [ObjectId(pid) for pid in package_ids if ObjectId.is_valid(pid)]
+    packages = {
+        str(package["_id"]): package
+        async for package in db.subscription_package.find({"_id": {"$in": package_ids}})
+    }
+
+    async def jobs():
+        seen = set()
+        cursor = db.subscription_invoices.find(query).sort("created_at", 1).limit(INVOICE_EXPORT_MAX)
+        async for invoice in cursor:
+            name = f"invoice-{invoice.get('invoice_number') or invoice['_id']}.pdf"
+            if name in seen:
+                name = f"invoice-{invoice.get('invoice_number')}-{invoice['_id']}.pdf"
+            seen.add(name)
+            yield name, invoice, user, packages.get(str(invoice.get("package_id")))
+
+    filename = f"invoices-{datetime.utcnow():%Y%m%d-%H%M%S}.zip"
+    return StreamingResponse(
+        invoice_pdf.stream_zip(invoice_pdf.invoice_renderer.render_many(jobs())),
+        media_type="application/zip",
+        headers={"Content-Disposition": f"attachment; filename={filename}"},
+    )
@@ -7,9 +7,12 @@ import math
 from typing import Annotated
 
 from fastapi import APIRouter, Depends, HTTPException, status, Query
+from pymongo.errors import DuplicateKeyError
 
 from database import db
 from utils import users as user_utils
+from utils import subscription as subscription_utils
+from utils.quota import quota_engine
 from models import users as users_models
 from models.subscription import SubscribeRequest
 from models.payment import StripeSubscribePaymentRequest, SubscribePaymentRequest
@@ -50,7 +53,8 @@ async def create_subscription_payment(
         "amount": amount,
         "currency": "BDT",
         "payment_method": 'Bkash',
-        "transaction_id": "transaction_id",
+        # Filled in once bKash confirms; the unique index skips nulls
+        "transaction_id": None,
         "status": "pending",
         "created_at": datetime.utcnow(),
         "updated_at": datetime.utcnow(),
@@ -87,15 +91,16 @@ async def create_stripe_subscription_payment(
     # ────────────────────────────────────────────────
     # 1. Prevent duplicate transaction (very important!)
     # ────────────────────────────────────────────────
-    existing = await db.payment_subscribe_invoices.find_one(
-        {"transaction_id": payload.transaction_id},
-        projection={"_id": 1}
-    )
-    if existing:
-        raise HTTPException(
-            status_code=status.HTTP_409_CONFLICT,
-            detail="Payment with this transaction_id already exists"
+    if payload.transaction_id:
+        existing = await db.payment_subscribe_invoices.find_one(
+            {"transaction_id": payload.transaction_id},
+            projection={"_id": 1}
         )
+        if existing:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Payment with this transaction_id already exists"
+            )
 
     now = datetime.utcnow()
 
@@ -143,7 +148,15 @@ async def create_stripe_subscription_payment(
     # ────────────────────────────────────────────────
     # 5. Insert payment record
     # ────────────────────────────────────────────────
-    await db.payment_subscribe_invoices.insert_one(payment)
+    try:
+        await db.payment_subscribe_invoices.insert_one(payment)
+    except DuplicateKeyError:
+        # Lost a race with the same confirmation arriving twice
+        await db.subscription_invoices.delete_one({"_id": invoice_id})
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Payment with this transaction_id already exists"
+        )
 
     features = await db.subscription_features.find_one(
         {"package_id": ObjectId(payload.package_id)}
@@ -164,6 +177,7 @@ async def create_stripe_subscription_payment(
         {"$set": doc},
         upsert=True
     )
+    quota_engine.invalidate(user_id)
 
     # Optional: you could also create a combined response
     return {
@@ -193,34 +207,10 @@ async def get_user_payments(
     skip = (page - 1) * limit
     query = {"user_id": user_id}
 
-    # 1. Get total count
-    total = await db.payment_subscribe_invoices.count_documents(query)
-
-    # 2. Fetch documents
-    cursor = db.payment_subscribe_invoices.find(query).sort("_id", -1).skip(skip).limit(limit)
-
-    payment_data = []
-    async for doc in cursor:
-        # --- THE FIX STARTS HERE ---
-        # Convert the main ID
-        doc["id"] = str(doc.pop("_id"))
-
-        package_id = doc.get("package_id")
-        if package_id:
-            package_data = await db.subscription_package.find_one({"_id": ObjectId(package_id)})
-            if package_data:
-                # Convert package ObjectIds to strings
-                package_data["_id"] = str(package_data["_id"])
-                # Append the package object to the invoice document
-                doc["package"] = package_data
-
-        # Convert any other ObjectIds found in the document keys
-        for key, value in doc.items():
-            if isinstance(value, ObjectId):
-                doc[key] = str(value)
-        # --- THE FIX ENDS HERE ---
-
-        payment_data.append(doc)
+    # Count, page and package join in one round trip
+    total, payment_data = await subscription_utils.paginate_with_packages(
+        db.payment_subscribe_invoices, query, skip, limit
+    )
 
     return {
         "page": page,
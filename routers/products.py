@@ -2,11 +2,14 @@ import json
 import re
 import hashlib
 from math import ceil
+from datetime import datetime, timezone
 from enum import Enum
 from pydantic import BaseModel
 
 from fastapi.encoders import jsonable_encoder
-from fastapi import APIRouter, Query, HTTPException, Header, Request
+from fastapi import APIRouter, Query, HTTPException, Header, Request, Response
+from fastapi.responses import StreamingResponse
+from bson import ObjectId
 
 from database import db
 from models.products import Product
@@ -17,6 +20,9 @@ from scriping_files.scriping_pages import playwright_main
 from scriping_files.details_scriping_page import playwright_main_details
 from models.users import User
 from utils import users as users_utils
+from utils import price_history
+from utils import export
+from utils.quota import quota_engine
 
 
 
@@ -25,10 +31,76 @@ class SortOption(str, Enum):
     price_low  = "price-low"
     price_high = "price-high"
     rating     = "rating"
+    sales      = "sales"
     newest     = "newest"
 
 
 
+class ProductView(str, Enum):
+    summary = "summary"
+    card    = "card"
+    full    = "full"
+
+
+# Fields returned per view; None is the whole document (with details for GET /products/{id})
+PRODUCT_VIEWS = {
+    ProductView.summary: ["offer_id", "title", "product_name", "image", "price_float"],
+    ProductView.card: [
+        "offer_id", "title", "product_name", "category", "url", "image", "seller_icon",
+        "price", "price_float", "rating_num", "sold_count", "moq_num", "promotion", "is_ad",
+    ],
+    ProductView.full: None,
+}
+
+_FIELD_NAME = re.compile(r"^[A-Za-z0-9_]+(\.[A-Za-z0-9_]+)*$")
+
+
+def _parse_fields(fields: str | None, default: list[str] | None) -> list[str] | None:
+    """``fields=a,b.c`` as a list of paths; ``default`` when not given."""
+    if not fields:
+        return default
+    columns = list(dict.fromkeys(field.strip() for field in fields.split(",") if field.strip()))
+    if not columns or not all(_FIELD_NAME.match(field) for field in columns):
+        raise HTTPException(status_code=400, detail="Invalid fields")
+    return columns
+
+
+def _projection(columns: list[str] | None, *always: str) -> dict | None:
+    if columns is None:
+        return None
+    paths = list(dict.fromkeys([*columns, *always]))
+    # "details" and "details.x" together is a path collision in Mongo
+    return {path: 1 for path in paths if not any(path.startswith(f"{other}.") for other in paths)}
+
+
+def _details_projection(columns: list[str] | None) -> dict | None:
+    """product_details projection for the requested fields; None when no details are wanted."""
+    if columns is None:
+        return {"_id": 0, "details": 1}
+    paths = [field for field in columns if field == "details" or field.startswith("details.")]
+    return {"_id": 0, **_projection(paths)} if paths else None
+
+
+
+class ExportFormat(str, Enum):
+    ndjson = "ndjson"
+    csv    = "csv"
+
+
+# Default export columns; the raw 1688 ``details`` tree is left out
+EXPORT_FIELDS = [
+    "offer_id", "title", "product_name", "category", "url", "image",
+    "price", "price_float", "rating_num", "sold_count", "moq_num",
+    "promotion", "is_ad", "scraped_at", "last_changed_at",
+]
+
+EXPORT_MEDIA_TYPES = {
+    ExportFormat.ndjson: "application/x-ndjson",
+    ExportFormat.csv:    "text/csv",
+}
+
+
+
 class AttributeWithValues(BaseModel):
     attribute_name: str
     values: list[str]
@@ -56,22 +128,15 @@ async def create_product(product: Product):
 
 
 
-@router.get("/")
-async def list_products(
-    request: Request,
-    searching:  str | None   = Query(None),
-    category:   str | None   = Query(None),
-    min_price:  float | None = Query(None, ge=0),
-    max_price:  float | None = Query(None, ge=0),
-    discount:   bool | None  = Query(None),      # true → promotion != null
-    sort:       SortOption   = Query(SortOption.newest),
-    page:       int          = Query(1, ge=1),
-    limit:      int          = Query(10, ge=1, le=100),
-):
-    user = await users_utils.find_credentials(request)
-    skip = (page - 1) * limit
-
-    # ── Build query ────────────────────────────────────────────────
+def _build_query(
+    searching: str | None = None,
+    category:  str | None = None,
+    min_price: float | None = None,
+    max_price: float | None = None,
+    min_moq:   int | None = None,
+    max_moq:   int | None = None,
+) -> dict:
+    """Listing filters shared by GET /products/ and GET /products/export."""
     query = {}
 
     if searching:
@@ -93,10 +158,46 @@ async def list_products(
     if price_filter:
         query["price_float"] = price_filter     # query the new numeric field
 
+    moq_filter = {}
+    if min_moq is not None:
+        moq_filter["$gte"] = min_moq
+    if max_moq is not None:
+        moq_filter["$lte"] = max_moq
+    if moq_filter:
+        query["moq_num"] = moq_filter
+
+    return query
+
+
+@router.get("/")
+async def list_products(
+    request: Request,
+    response: Response,
+    searching:  str | None   = Query(None),
+    category:   str | None   = Query(None),
+    min_price:  float | None = Query(None, ge=0),
+    max_price:  float | None = Query(None, ge=0),
+    discount:   bool | None  = Query(None),      # true → promotion != null
+    min_moq:    int | None   = Query(None, ge=0),
+    max_moq:    int | None   = Query(None, ge=0),
+    sort:       SortOption   = Query(SortOption.newest),
+    page:       int          = Query(1, ge=1),
+    limit:      int          = Query(10, ge=1, le=100),
+    view:       ProductView  = Query(ProductView.full),
+    fields:     str | None   = Query(None, description="Comma separated fields, overrides view"),
+):
+    user = await users_utils.find_credentials(request)
+    await quota_engine.consume(user, response)
+    skip = (page - 1) * limit
+    projection = _projection(_parse_fields(fields, PRODUCT_VIEWS[view]))
+
+    query = _build_query(searching, category, min_price, max_price, min_moq, max_moq)
+
     sort_map = {
         SortOption.price_low:  [("price_float",  1)],   # was "price.amount"
         SortOption.price_high: [("price_float", -1)],   # was "price.amount"
-        SortOption.rating:     [("rating",       -1)],
+        SortOption.rating:     [("rating_num",   -1)],   # numeric, set at ingest
+        SortOption.sales:      [("sold_count",   -1)],
         SortOption.newest:     [("_id",          -1)],
     }
 
@@ -112,18 +213,19 @@ async def list_products(
         except Exception:
             pass
 
-    cursor = db.products.find(query).skip(skip).limit(limit).sort(mongo_sort)
+    cursor = db.products.find(query, projection=projection).skip(skip).limit(limit).sort(mongo_sort)
     matched = None
     products = []
     async for product in cursor:
         image = product.get("image")
-        product["image"] = (
-            f"{request.base_url}{image}"
-            if image and image.startswith("assets")
-            else image.replace("http://localhost:8001", "http://192.168.68.118:8001")
-            if image
-            else None
-        )
+        if "image" in product:
+            product["image"] = (
+                f"{request.base_url}{image}"
+                if image and image.startswith("assets")
+                else image.replace("http://localhost:8001", "http://192.168.68.118:8001")
+                if image
+                else None
+            )
         product["_id"] = str(product["_id"])
         products.append(product)
 
@@ -163,10 +265,76 @@ async def list_products(
     }
 
 
-import json
 
-from bson.objectid import ObjectId
-import json
+@router.get("/export")
+async def export_products(
+    request: Request,
+    response: Response,
+    format:     ExportFormat = Query(ExportFormat.ndjson),
+    fields:     str | None   = Query(None, description="Comma separated fields, default EXPORT_FIELDS"),
+    gzip:       bool         = Query(False),
+    since:      datetime | None = Query(None, description="Only offers added or changed since"),
+    cursor:     str | None   = Query(None, description="Resume after this _id"),
+    searching:  str | None   = Query(None),
+    category:   str | None   = Query(None),
+    min_price:  float | None = Query(None, ge=0),
+    max_price:  float | None = Query(None, ge=0),
+    min_moq:    int | None   = Query(None, ge=0),
+    max_moq:    int | None   = Query(None, ge=0),
+):
+    """
+    Streams the filtered catalog in ``_id`` order straight from the cursor.
+
+    Each row carries its ``_id``; pass the last one back as ``cursor`` to
+    resume an interrupted export, or ``since`` for an incremental sync.
+    """
+    user = await users_utils.find_credentials(request)
+    await quota_engine.consume(user, response)
+    await users_utils.count_api_hit('/products/export', user)
+
+    query = _build_query(searching, category, min_price, max_price, min_moq, max_moq)
+
+    if cursor is not None:
+        if not ObjectId.is_valid(cursor):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        query["_id"] = {"$gt": ObjectId(cursor)}
+
+    if since is not None:
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        # New offers by _id time, changed ones by last_changed_at (epoch seconds)
+        changed = [
+            {"_id": {"$gte": ObjectId.from_datetime(since)}},
+            {"last_changed_at": {"$gte": since.timestamp()}},
+        ]
+        query = {"$and": [query, {"$or": changed}]} if "$or" in query else {**query, "$or": changed}
+
+    columns = _parse_fields(fields, EXPORT_FIELDS)
+    projection = _projection(columns)
+
+    documents = (
+        db.products.find(query, projection=projection)
+        .sort("_id", 1)
+        .batch_size(export.EXPORT_BATCH_SIZE)
+    )
+
+    if format == ExportFormat.csv:
+        lines = export.csv_stream(documents, ["_id", *[c for c in columns if c != "_id"]])
+    else:
+        lines = export.ndjson_stream(documents)
+
+    filename = f"products-{datetime.utcnow():%Y%m%d-%H%M%S}.{format.value}"
+    media_type = EXPORT_MEDIA_TYPES[format]
+    if gzip:
+        filename += ".gz"
+        media_type = "application/gzip"
+
+    return StreamingResponse(
+        export.encode_stream(lines, gzip=gzip),
+        media_type=media_type,
+        # Returned directly, so the quota headers set on ``response`` are copied over
+        headers={**response.headers, "Content-Disposition": f"attachment; filename={filename}"},
+    )
 
 def clean_document(obj):
     if isinstance(obj, dict):
@@ -178,31 +346,91 @@ def clean_document(obj):
     return obj
 
 def serialize_product(product):
-    cleaned = clean_document(product)
-    json_string = json.dumps(cleaned)
-    product_back = json.loads(json_string)
-    return product_back
+    return clean_document(product)
+
+async def _with_details(product: dict, projection: dict) -> bool:
+    """
+    Attach the (projected) product_details blob; documents from before the
+    split still embed it.  False when nothing is stored, or only the empty
+    blob a failed extraction leaves behind.
+    """
+    if product.get('details'):
+        return True
+    stored = await db.product_details.find_one(
+        {'offer_id': product['offer_id'], 'details': {'$nin': [None, {}]}}, projection=projection
+    )
+    if stored is None:
+        return False
+    # Sections the projection asked for may be missing; that's not a reason to re-scrape
+    product['details'] = stored.get('details', {})
+    return True
 
 @router.get("/{product_id}")
-async def get_product(request: Request, product_id: str):
+async def get_product(
+    request: Request,
+    response: Response,
+    product_id: str,
+    view:   ProductView = Query(ProductView.full),
+    fields: str | None  = Query(None, description="Comma separated fields, overrides view"),
+):
+    """
+    ``view``/``fields`` select what is read: offer_id and is_details_page
+    always come back, and ``details`` (or ``details.<section>``) is only
+    joined from product_details when asked for.
+    """
+    user = await users_utils.find_credentials(request)
+    await quota_engine.consume(user, response)
 
-    await users_utils.find_credentials(request)
+    columns = _parse_fields(fields, PRODUCT_VIEWS[view])
+    projection = _projection(columns, 'offer_id', 'is_details_page')
+    details_projection = _details_projection(columns)
 
-    product = await db.products.find_one({'offer_id': str(product_id)})
+    product = await db.products.find_one({'offer_id': str(product_id)}, projection=projection)
 
-    if product and product.get('is_details_page') == True and product.get('details'):
+    if product is None:
+        raise HTTPException(status_code=404, detail="Product not found")
 
+    # Views without details never need a scrape
+    if details_projection is None:
         return serialize_product(product)
 
-    if product is None:
-        raise HTTPException(status_code=404, detail="Product not found")
+    if product.get('is_details_page') == True and await _with_details(product, details_projection):
+        return serialize_product(product)
 
     product_id = product.get('offer_id')
 
     await scrape_details_page1688(product_id, request)
-    product = await db.products.find_one({"offer_id": product_id})
-    product["_id"] = str(product["_id"])
-    return {"updated": True, "product": product}
+    product = await db.products.find_one({"offer_id": product_id}, projection=projection)
+    if details_projection is not None:
+        await _with_details(product, details_projection)
+    return {"updated": True, "product": serialize_product(product)}
+
+
+@router.get("/{product_id}/history")
+async def get_product_history(
+    request: Request,
+    response: Response,
+    product_id: str,
+    start: datetime | None = Query(None),
+    end:   datetime | None = Query(None),
+):
+    user = await users_utils.find_credentials(request)
+    await quota_engine.consume(user, response)
+    await users_utils.count_api_hit('/products/history', user)
+
+    start, end = price_history.default_range(start, end)
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+
+    samples = await price_history.read_history(product_id, start, end)
+
+    return {
+        "offer_id": product_id,
+        "start":    start,
+        "end":      end,
+        "total":    len(samples),
+        "results":  samples,
+    }
 
 
 
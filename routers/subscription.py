@@ -9,6 +9,8 @@ from fastapi import APIRouter, Depends, HTTPException, status
 
 from database import db
 from utils import users as user_utils
+from utils import subscription as subscription_utils
+from utils.quota import quota_engine
 from models import users as users_models
 from models.subscription import SubscribeRequest
 
@@ -65,6 +67,7 @@ async def subscribe_user(
         {"$set": doc},
         upsert=True
     )
+    quota_engine.invalidate(user_id)
 
     return {
         "message": "Subscription activated successfully",
@@ -105,28 +108,4 @@ async def get_packages_with_features():
     """
     Returns all subscription packages along with their features.
     """
-
-    packages_cursor = db.subscription_package.find({})
-    packages = await packages_cursor.to_list(length=None)
-
-    result = []
-
-    for package in packages:
-        package_id = package["_id"]
-
-        features = await db.subscription_features.find_one({"package_id": package_id})
-
-        # Convert ObjectIds to strings for JSON serialization
-        package["_id"] = str(package["_id"])
-        features_dict = {}
-        if features:
-            features_dict = {k: v for k, v in features.items() if k not in ["_id", "package_id"]}
-            features_dict["package_id"] = str(features["package_id"])
-            features_dict["_id"] = str(features["_id"])
-
-        result.append({
-            "package": package,
-            "features": features_dict
-        })
-
-    return result
+    return await subscription_utils.get_packages_with_features()
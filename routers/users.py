@@ -2,8 +2,11 @@
 import os
 import shutil
 import secrets
+from enum import Enum
+from math import ceil
 from pathlib import Path
 from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
 from datetime import datetime, timedelta, timezone
 
 from typing import Annotated
@@ -11,7 +14,7 @@ from typing import Annotated
 
 from fastapi.encoders import jsonable_encoder
 from fastapi.security import OAuth2PasswordRequestForm
-from fastapi import APIRouter, HTTPException, Depends, status, UploadFile, File, Request
+from fastapi import APIRouter, HTTPException, Depends, status, UploadFile, File, Request, Query
 
 from database import db
 from utils import users as user_utils
@@ -32,40 +35,48 @@ ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES"))
 router = APIRouter(prefix="/users", tags=["Users"])
 
 
+async def _resend_registration_otp(email: str):
+    _otp_data = {
+        "email": email,
+        "otp": user_utils.generate_otp(),
+        "verify": False,
+        "expire": user_utils.expire_token(),        # Make sure this returns a datetime, not a function
+        "created_at": datetime.utcnow(),
+        "updated_at": datetime.utcnow()
+    }
+
+    # Replace the entire document
+    await db.OTP.replace_one(
+        {"email": _otp_data["email"]},  # Filter by email
+        _otp_data,                      # Full new document
+        upsert=True                      # Insert if not exists
+    )
+
+    return {
+        "message": "Registration Successfully Done",
+    }
+
+
 @router.post("/registration")
 async def registration(user: users_models.User):
 
     data = jsonable_encoder(user)
 
     # ✅ Hash the password before saving
-    data["password"] = user_utils.get_password_hash(data["password"])
+    data["password"] = await user_utils.get_password_hash(data["password"])
 
     _email = user.email
-    fiend_user= await db.OTP.find_one({"email":_email})
+    # The OTP document may already be gone (TTL), so the account is the source of truth
+    fiend_user = await db.User.find_one({"email": _email}, projection={"_id": 1})
 
     if fiend_user:
+        return await _resend_registration_otp(data["email"])
 
-        _otp_data = {
-            "email": data["email"],
-            "otp": user_utils.generate_otp(),
-            "verify": False,
-            "expire": user_utils.expire_token(),        # Make sure this returns a datetime, not a function
-            "created_at": datetime.utcnow(),
-            "updated_at": datetime.utcnow()
-        }
-
-        # Replace the entire document
-        await db.OTP.replace_one(
-            {"email": _otp_data["email"]},  # Filter by email
-            _otp_data,                      # Full new document
-            upsert=True                      # Insert if not exists
-        )
-
-        return {
-            "message": "Registration Successfully Done",
-        }
-
-    _user = await db.User.insert_one(data)
+    try:
+        _user = await db.User.insert_one(data)
+    except DuplicateKeyError:
+        # Registered concurrently; the unique email index caught it
+        return await _resend_registration_otp(data["email"])
 
     user_id = _user.inserted_id  # ✅ this is ObjectId
 
@@ -84,10 +95,10 @@ async def registration(user: users_models.User):
         "created_at": datetime.utcnow(),
         "updated_at": datetime.utcnow()
     }
-    otp_data = jsonable_encoder(_otp_data)
+    # Dates stay datetimes so the OTP TTL index can expire them
 
     # ✅ Insert OTP
-    await db.OTP.insert_one(otp_data)
+    await db.OTP.insert_one(_otp_data)
 
     return {"message": "Registration Successfully Done"}
 
@@ -107,9 +118,12 @@ async def otp_verify(otp: users_models.OTP):
             status_code=404,
             detail="Invalid OTP"
         )
-    expire_time = datetime.fromisoformat(find_otp["expire"])
+    # Older OTPs stored expire as an ISO string
+    expire_time = find_otp.get("expire")
+    if isinstance(expire_time, str):
+        expire_time = datetime.fromisoformat(expire_time)
     # Optional: Expiry Check
-    if find_otp.get("expire") and expire_time < datetime.utcnow():
+    if expire_time and expire_time < datetime.utcnow():
         raise HTTPException(
             status_code=400,
             detail="OTP expired"
@@ -139,6 +153,7 @@ async def otp_verify(otp: users_models.OTP):
             }
         }
     )
+    user_utils.invalidate_user(otp.email)
 
     # return {"message": "OTP verified successfully"}
     return {
@@ -166,10 +181,10 @@ async def send_otp(email: users_models.SendOTPRequest):
         "created_at": datetime.utcnow(),
         "updated_at": datetime.utcnow()
     }
-    otp_data = jsonable_encoder(_otp_data)
+    # Dates stay datetimes so the OTP TTL index can expire them
 
     # ✅ Insert OTP
-    await db.OTP.insert_one(otp_data)
+    await db.OTP.insert_one(_otp_data)
 
     return {
         "title": "Check Your Inbox",
@@ -183,7 +198,7 @@ async def send_otp(email: users_models.SendOTPRequest):
 @router.post("/token")
 async def login_for_access_token(form_data: Annotated[OAuth2PasswordRequestForm, Depends()]) -> users_models.Token:
     user = await db.User.find_one({'email': form_data.username})
-    user = user_utils.authenticate_user(user, form_data.password)
+    user = await user_utils.authenticate_user(user, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -209,7 +224,7 @@ async def login_for_access_token(form_data: Annotated[OAuth2PasswordRequestForm,
 
 @router.get("/me/")
 async def read_users_me(current_user: Annotated[users_models.ReadOnlyUser, Depends(user_utils.get_current_active_user)]) -> users_models.ReadOnlyUser:
-    user_profile = await db.user_profile.find_one({"user": ObjectId(current_user["_id"])})
+    user_profile = await user_utils.get_user_profile(ObjectId(current_user["_id"]))
     current_user['profile'] = user_profile
     return current_user
 
@@ -231,6 +246,7 @@ async def update_profile(
             "updated_at": datetime.utcnow()
         }
         await db.user_profile.insert_one(user_obj)
+        user_utils.invalidate_user_profile(ObjectId(current_user["_id"]))
         return {"message": "Profile created successfully"}
 
     # Update the user's profile in the database
@@ -247,6 +263,7 @@ async def update_profile(
             }
         }
     )
+    user_utils.invalidate_user_profile(ObjectId(current_user["_id"]))
 
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="Profile not found or not updated")
@@ -299,6 +316,7 @@ async def update_profile(
         },
         upsert=True
     )
+    user_utils.invalidate_user_profile(user_id)
 
     return {"message": "Profile picture updated", "url": relative_path}
 
@@ -350,6 +368,9 @@ async def secret_api_key(
     # Log for debugging - if modified_count + upserted_id == 0, something is wrong
     print(f"Matched: {result.matched_count}, Modified: {result.modified_count}")
 
+    # Old keys must stop working immediately on this worker
+    user_utils.invalidate_user_credentials(user_id)
+
     # 4. Return the RAW secret
     return {
         "app_key": app_key,
@@ -383,12 +404,29 @@ async def get_secret_api_key(
 
 
 
+class UsageGranularity(str, Enum):
+    hour = "hour"
+    day  = "day"
+
+
+USAGE_DEFAULT_RANGE = {
+    UsageGranularity.hour: timedelta(hours=24),
+    UsageGranularity.day:  timedelta(days=30),
+}
+
+
 @router.get("/api-uses/")
 async def api_uses(
     current_user: Annotated[
         users_models.User,
         Depends(user_utils.get_current_active_user)
-    ]
+    ],
+    granularity: UsageGranularity | None = Query(None),
+    start:       datetime | None         = Query(None),
+    end:         datetime | None         = Query(None),
+    endpoint:    str | None              = Query(None),
+    page:        int                     = Query(1, ge=1),
+    limit:       int                     = Query(100, ge=1, le=1000),
 ):
     try:
         # Safely get the user_id
@@ -396,20 +434,67 @@ async def api_uses(
     except Exception:
         raise HTTPException(status_code=500, detail="Invalid User ID")
 
-    query = db.api_hits.find({"user_id": user_id})
+    if granularity is None:
+        # Lifetime totals per endpoint
+        query = db.api_hits.find({"user_id": user_id})
+
+        data = []
+        async for item in query:
+            item["id"] = str(item.pop("_id"))
+            item["user_id"] = str(item["user_id"])
+
+            for key, value in item.items():
+                if isinstance(value, ObjectId):
+                    item[key] = str(value)
 
-    data = []
-    async for item in query:
-        item["id"] = str(item.pop("_id"))
-        item["user_id"] = str(item["user_id"])
+            data.append(item)
 
-        for key, value in item.items():
-            if isinstance(value, ObjectId):
-                item[key] = str(value)
+        return { "data": data }
 
-        data.append(item)
+    # Time series from the hour/day rollups maintained by the hit flusher
+    if start is not None and start.tzinfo is not None:
+        start = start.astimezone(timezone.utc).replace(tzinfo=None)
+    if end is not None and end.tzinfo is not None:
+        end = end.astimezone(timezone.utc).replace(tzinfo=None)
+    end = end or datetime.utcnow()
+    start = start or end - USAGE_DEFAULT_RANGE[granularity]
 
-    return { "data": data }
+    match = {
+        "user_id": user_id,
+        "granularity": granularity.value,
+        "bucket": {"$gte": start, "$lte": end},
+    }
+    if endpoint:
+        match["endpoint"] = endpoint
+
+    skip = (page - 1) * limit
+    pipeline = [
+        {"$match": match},
+        {"$sort": {"bucket": -1, "endpoint": 1}},
+        {"$facet": {
+            "results": [
+                {"$skip": skip},
+                {"$limit": limit},
+                {"$project": {"_id": 0, "endpoint": 1, "bucket": 1, "hits": 1}},
+            ],
+            "total": [{"$count": "count"}],
+        }},
+    ]
+
+    facet = await db.api_usage_rollups.aggregate(pipeline).to_list(length=1)
+    facet = facet[0] if facet else {"results": [], "total": []}
+    total = facet["total"][0]["count"] if facet["total"] else 0
+
+    return {
+        "granularity": granularity.value,
+        "start":       start,
+        "end":         end,
+        "page":        page,
+        "limit":       limit,
+        "total":       total,
+        "total_pages": ceil(total / limit),
+        "data":        facet["results"],
+    }
 
 
 
@@ -451,7 +536,7 @@ async def reset_password(request: ResetPasswordRequest):
 
     # 4. Update the User Password
     # Note: We filter ONLY by email here, as OTP lives in the OTP collection
-    new_hashed_password = user_utils.get_password_hash(request.new_password)
+    new_hashed_password = await user_utils.get_password_hash(request.new_password)
 
     user_update = await db.User.update_one(
         {"email": _email},
@@ -468,6 +553,7 @@ async def reset_password(request: ResetPasswordRequest):
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
         )
+    user_utils.invalidate_user(_email)
 
     # 5. Mark OTP as used (Invalidate)
     await db.OTP.update_one(
@@ -39,6 +39,12 @@ def pop_blocked_redirect(page: Page) -> str | None:
     return _blocked_redirects.pop(page, None)
 
 
+def forget_page(page: Page) -> None:
+    """Drop redirect bookkeeping for a page that is closed or handed back to a pool."""
+    _allowed_urls.pop(page, None)
+    _blocked_redirects.pop(page, None)
+
+
 def _is_blocked_redirect(page: Page, request: Request) -> bool:
     if not BLOCK_PAGE_REDIRECTS:
         return False
@@ -127,16 +133,16 @@ def pick_browser_agent() -> dict:
 
 import os
 
-def launch_browser(playwright: Playwright):
+def launch_browser(playwright: Playwright, user_data_dir: str = USER_DATA_DIR):
     proxy_config = build_proxy_config()
     agent = pick_browser_agent()
 
     is_docker = os.getenv('RUNNING_IN_DOCKER', 'false').lower() == 'true'
 
     if FRESH_BROWSER_PROFILE:
-        destroy_browser_profile()
+        destroy_browser_profile(user_data_dir)
 
-    print(f"Launching {'fresh ' if FRESH_BROWSER_PROFILE else ''}browser profile: {USER_DATA_DIR}")
+    print(f"Launching {'fresh ' if FRESH_BROWSER_PROFILE else ''}browser profile: {user_data_dir}")
 
     # Docker needs headless + extra Chromium args to run without a display
     headless = is_docker
@@ -149,7 +155,7 @@ def launch_browser(playwright: Playwright):
     ] if is_docker else ['--ignore-certificate-errors']
 
     context = playwright.chromium.launch_persistent_context(
-        user_data_dir=USER_DATA_DIR,
+        user_data_dir=user_data_dir,
         headless=headless,
         ignore_https_errors=True,
         viewport=VIEWPORT,
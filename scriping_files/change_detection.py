@@ -0,0 +1,139 @@
+"""Content hashing for scraped product details so re-scrapes only write what changed."""
+import hashlib
+import json
+
+
+def hash_section(value) -> str:
+    payload = json.dumps(value, sort_keys=True, ensure_ascii=False, separators=(',', ':'), default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def _splittable(value) -> bool:
+    # Sub-keys become Mongo field paths, so they must be safe to embed in one
+    return isinstance(value, dict) and bool(value) and all(
+        '.' not in key and not key.startswith('$') for key in value
+    )
+
+
+def section_hashes(details: dict) -> dict:
+    """
+    Hash every section of a details blob, as ``{path: hash}``.
+
+    Sections are the top-level keys, and one level deeper for dict values:
+    window.context payloads keep nearly everything under ``global``, so
+    hashing ``global.<section>`` is what lets a re-scrape write only the
+    part that changed.
+    """
+    hashes = {}
+    for key, value in (details or {}).items():
+        if _splittable(value):
+            for sub_key, sub_value in value.items():
+                hashes[f'{key}.{sub_key}'] = hash_section(sub_value)
+        else:
+            hashes[key] = hash_section(value)
+    return hashes
+
+
+def _flatten_hashes(stored: dict) -> dict:
+    """Stored ``details_hashes`` (nested by path) back to ``{path: hash}``."""
+    flat = {}
+    for key, value in (stored or {}).items():
+        if isinstance(value, dict):
+            for sub_key, digest in value.items():
+                flat[f'{key}.{sub_key}'] = digest
+        else:
+            flat[key] = value
+    return flat
+
+
+def _nest(hashes: dict) -> dict:
+    nested: dict = {}
+    for path, digest in hashes.items():
+        key, _, sub_key = path.partition('.')
+        if sub_key:
+            nested.setdefault(key, {})[sub_key] = digest
+        else:
+            nested[key] = digest
+    return nested
+
+
+def _conflicts(old_paths, new_paths) -> bool:
+    """A section that turned into (or out of) a dict can't be patched path by path."""
+    old_roots = {path.split('.', 1)[0]: '.' in path for path in old_paths}
+    return any(
+        key in old_roots and old_roots[key] != ('.' in path)
+        for path in new_paths
+        for key in [path.split('.', 1)[0]]
+    )
+
+
+def build_details_update(details: dict, old_hashes: dict | None, now: float, field: str = 'details') -> dict:
+    """
+    Build the Mongo update for a re-scraped details blob.
+
+    Only sections whose hash differs from ``old_hashes`` are ``$set``;
+    sections that disappeared are ``$unset``.  Returns an empty dict when
+    nothing changed.  Without previous hashes, or when a section changed
+    shape, the whole blob is written.
+    """
+    new_hashes = section_hashes(details)
+    old_hashes = _flatten_hashes(old_hashes) if old_hashes is not None else None
+
+    if old_hashes is None or _conflicts(old_hashes, new_hashes):
+        return {'$set': {field: details, 'details_hashes': _nest(new_hashes), 'last_changed_at': now}}
+
+    changed = [path for path, digest in new_hashes.items() if old_hashes.get(path) != digest]
+    removed = [path for path in old_hashes if path not in new_hashes]
+    if not changed and not removed:
+        return {}
+
+    update: dict = {'$set': {'last_changed_at': now}}
+    for path in changed:
+        key, _, sub_key = path.partition('.')
+        update['$set'][f'{field}.{path}'] = details[key][sub_key] if sub_key else details[key]
+        update['$set'][f'details_hashes.{path}'] = new_hashes[path]
+    if removed:
+        update['$unset'] = {}
+        for path in removed:
+            update['$unset'][f'{field}.{path}'] = ''
+            update['$unset'][f'details_hashes.{path}'] = ''
+    return update
+
+
+async def upsert_changed_details(collection, details_collection, offer_id: str, details: dict, fields: dict, now: float):
+    """
+    Upsert a product's details, writing only the sections that changed.
+
+    The details blob and its hashes live in ``details_collection`` (one
+    document per offer_id); ``collection`` keeps the compact listing
+    summary.  ``fields`` (e.g. scraped_at, status) are always ``$set`` on
+    the summary; when nothing in ``details`` changed they are the only
+    thing written.
+    """
+    existing = await details_collection.find_one({'offer_id': offer_id}, projection={'details_hashes': 1})
+    update = build_details_update(details, existing.get('details_hashes') if existing else None, now)
+
+    changed = bool(update)
+    print(f"{'Details changed' if changed else 'Details unchanged'} for offer_id={offer_id}")
+    if changed:
+        await details_collection.update_one({'offer_id': offer_id}, update, upsert=True)
+
+    summary = {**fields, 'last_changed_at': now} if changed else fields
+    # Documents written before the split still embed the blob
+    return await collection.update_one(
+        {'offer_id': offer_id},
+        {'$set': summary, '$unset': {'details': '', 'details_hashes': ''}},
+        upsert=True,
+    )
+
+
+def build_fields_update(fields: dict, now: float) -> list:
+    """
+    Pipeline update ``$set``ting ``fields`` that also bumps
+    ``last_changed_at`` when any of them differs from the stored value.
+    """
+    unchanged = {'$and': [{'$eq': [f'${field}', {'$literal': value}]} for field, value in fields.items()]}
+    return [{'$set': {
+        **{field: {'$literal': value} for field, value in fields.items()},
+        'last_changed_at': {'$cond': [unchanged, '$last_changed_at', now]},
+    }}]
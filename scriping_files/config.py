@@ -34,6 +34,11 @@ PROXY_URL       = _str('PROXY_URL') or _str('PROXY_SERVER')
 PROXY_USERNAME  = _str('PROXY_USERNAME')
 PROXY_PASSWORD  = _str('PROXY_PASSWORD')
 
+# ── Target hosts ───────────────────────────────────────────────────────────────
+# Point these (and PROXY_URL) at benchmarks/mock_1688.py for offline load tests.
+DETAIL_BASE_URL = _str('DETAIL_BASE_URL', 'https://detail.1688.com').rstrip('/')
+SEARCH_BASE_URL = _str('SEARCH_BASE_URL', 'https://s.1688.com').rstrip('/')
+
 # ── Paths ──────────────────────────────────────────────────────────────────────
 USER_DATA_DIR   = _str('USER_DATA_DIR', './.playwright-profile')
 OUTPUT_DIR      = _str('OUTPUT_DIR', './output')
@@ -81,6 +86,11 @@ BLOCK_PAGE_REDIRECTS    = _flag('BLOCK_PAGE_REDIRECTS', True)
 BLOCK_HEAVY_RESOURCES   = _flag('BLOCK_HEAVY_RESOURCES', True)
 BLOCKED_RESOURCE_TYPES  = {'font', 'image', 'media'}
 
+# ── Page pool ──────────────────────────────────────────────────────────────────
+USE_PAGE_POOL           = _flag('USE_PAGE_POOL', False)
+PAGE_POOL_SIZE          = _int('PAGE_POOL_SIZE', 2)
+PAGE_POOL_WARMUP_URL    = _str('PAGE_POOL_WARMUP_URL', 'https://www.1688.com/')
+
 # ── Detection keywords ─────────────────────────────────────────────────────────
 CAPTCHA_KEYWORDS = [
     'captcha',
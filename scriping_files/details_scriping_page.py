@@ -1,7 +1,9 @@
 import os
 import json
+import time
 import asyncio
 import random
+import itertools
 import requests
 from urllib.parse import urlparse
 from playwright.async_api import async_playwright
@@ -21,6 +23,9 @@ except ModuleNotFoundError:
     from database import db
 
 from fastapi.encoders import jsonable_encoder
+from scriping_files.change_detection import upsert_changed_details
+from scriping_files.normalize import normalize_details, parse_count, snapshot_from_variants
+from utils import price_history
 
 def save_image_from_url(image_url: str, save_dir: str = "downloads"):
     """
@@ -63,7 +68,7 @@ import re
 
 async def extract_categories(page):
 
-    script_content = page.evaluate("""
+    script_content = await page.evaluate("""
         () => {
             const scripts = document.querySelectorAll('script');
             for (const s of scripts) {
@@ -76,7 +81,7 @@ async def extract_categories(page):
     """)
 
     # Extract JSON from the script using regex
-    match = re.search(r'window\.context\s*=\s*\(function.*?\)\s*\(.*?,\s*(\{.*\})\s*\)\s*;', script_content, re.DOTALL)
+    match = re.search(r'window\.context\s*=\s*\(function.*?\)\s*\(.*?,\s*(\{.*\})\s*\)\s*;', script_content or '', re.DOTALL)
 
     if match:
         raw_json = match.group(1)
@@ -273,7 +278,116 @@ async def extract_product_packing(page):
 
 
 
+SKU_MODEL_SCRIPT = """
+() => {
+    const result = window.context && window.context.result;
+    const globalData = result && result.global && result.global.globalData;
+    if (!globalData || !globalData.skuModel) return null;
+    const model = globalData.model || {};
+    return {...globalData.skuModel, tradeModel: model.tradeModel || null};
+}
+"""
+
+# Stock as the size list renders it, so both variant paths store the same text
+STOCK_TEXT = "库存{}件"
+# Joins the names of the second and later spec dimensions into one size label
+SIZE_NAME_SEPARATOR = " / "
+
+
+def _sku_info(sku_info_map, *names):
+    # 1688 joins spec values with an HTML-escaped ">" in skuInfoMap keys
+    for separator in ("&gt;", ">"):
+        sku = sku_info_map.get(separator.join(names))
+        if sku:
+            return sku
+    return None
+
+
+def build_variants_from_sku_model(sku_model):
+    """
+    Build the colour → sizes matrix from window.context's skuModel.
+
+    The first spec dimension is the colour; any further dimensions are
+    combined into the size label.  SKUs without their own price take the
+    offer's tradeModel price (range).
+    :param sku_model: dict with skuProps, skuInfoMap and tradeModel
+    :return: list[dict] or None when the model is missing, unusable or unpriced
+    """
+    if not sku_model:
+        return None
+
+    sku_props = sku_model.get("skuProps") or []
+    sku_info_map = sku_model.get("skuInfoMap") or {}
+    if not sku_props or not sku_info_map:
+        return None
+
+    trade_model = sku_model.get("tradeModel") or {}
+    fallback_price = str(trade_model.get("priceDisplay") or "")
+
+    colors = sku_props[0].get("value") or []
+    size_props = [prop.get("value") or [] for prop in sku_props[1:]]
+    sizes = list(itertools.product(*size_props)) if all(size_props) else []
+
+    sku_matrix = []
+    for i, color in enumerate(colors):
+        color_name = color.get("name", "")
+        color_variant = {
+            "color_name": color_name,
+            "image": color.get("imageUrl") or "",
+            "active": i == 0,
+            "sizes": []
+        }
+
+        for combination in sizes or [()]:
+            size_names = tuple(size.get("name", "") for size in combination)
+            sku = _sku_info(sku_info_map, color_name, *size_names)
+            if not sku:
+                continue
+
+            price = str(sku.get("discountPrice") or sku.get("price") or fallback_price)
+            if not price:
+                return None
+
+            stock = sku.get("canBookCount")
+            color_variant["sizes"].append({
+                "size_name": SIZE_NAME_SEPARATOR.join(size_names),
+                "price": price,
+                "stock": "" if stock is None else STOCK_TEXT.format(stock),
+            })
+
+        sku_matrix.append(color_variant)
+
+    return sku_matrix
+
+
 async def extract_product_variants(page, requests):
+    """
+    Extract full SKU matrix from the page's window.context model without any
+    clicks, falling back to clicking each color variant when the model is
+    absent, unpriced or yields no sizes.
+    """
+    try:
+        sku_model = await page.evaluate(SKU_MODEL_SCRIPT)
+        sku_matrix = build_variants_from_sku_model(sku_model)
+    except Exception as e:
+        print(f"Could not read skuModel from window.context: {e}")
+        sku_matrix = None
+
+    # Unmatched skuInfoMap keys leave every colour without sizes
+    if not sku_matrix or not any(variant["sizes"] for variant in sku_matrix):
+        return await extract_product_variants_by_clicking(page, requests)
+
+    # Save variant images locally, as the click-based path does
+    save_dir = f"{utils_file.get_project_url(requests)}assets/images/variant_images"
+    with_image = [variant for variant in sku_matrix if variant["image"]]
+    saved = await asyncio.gather(*(save_images([variant["image"]], save_dir) for variant in with_image))
+    for variant, local in zip(with_image, saved):
+        variant["image"] = local[0] if local else ""
+
+    return sku_matrix
+
+
+async def extract_product_variants_by_clicking(page, requests):
     """
     Extract full SKU matrix dynamically: click each color variant and get only its sizes.
     """
@@ -527,18 +641,186 @@ async def extract_product_title_and_cart(page, requests):
     return data
 
 
+DETAIL_EXTRACTION_SCRIPT = """
+() => {
+    const text = (el) => (el ? el.innerText.trim() : '');
+    const all = (root, selector) => (root ? Array.from(root.querySelectorAll(selector)) : []);
+    const one = (root, selector) => (root ? root.querySelector(selector) : null);
+
+    // ---- Reviews ----
+    const evaluation = document.querySelector('#productEvaluation');
+    const reviewHl = all(evaluation, '.header-label-desc em.hl');
+    const reviewCount = one(evaluation, '.header-label-desc .brackets');
+
+    // ---- Attributes ----
+    const attributes = {};
+    for (const row of all(document, '#productAttributes .ant-descriptions-row')) {
+        const labels = all(row, '.ant-descriptions-item-label');
+        const values = all(row, '.ant-descriptions-item-content .field-value');
+        for (let j = 0; j < Math.min(labels.length, values.length); j++) {
+            attributes[text(labels[j])] = text(values[j]);
+        }
+    }
+
+    // ---- Packing ----
+    const packing = all(document, '#productPackInfo tbody tr').map((row) => {
+        const cols = all(row, 'td');
+        return {
+            color: text(cols[0]),
+            size: cols.length > 1 ? text(cols[1]) : null,
+            weight_g: cols.length > 2 ? text(cols[2]) : null,
+        };
+    });
+
+    // ---- Description ----
+    const images = all(document, '#description img')
+        .map((img) => img.getAttribute('src'))
+        .filter(Boolean);
+
+    const priceDesc = {};
+    let currentTitle = null;
+    for (const node of all(document, '.price-desc > dt, .price-desc > dl')) {
+        const value = text(node);
+        if (!value) continue;
+        if (node.tagName.toLowerCase() === 'dt') {
+            currentTitle = value;
+            priceDesc[currentTitle] = [];
+        } else if (currentTitle) {
+            priceDesc[currentTitle].push(value);
+        }
+    }
+
+    // ---- Title ----
+    const titleRoot = document.querySelector('#productTitle');
+    const sales = all(titleRoot, '.trade-info em.hl');
+
+    // ---- Cart ----
+    const cart = document.querySelector('#cartScrollBar');
+    const skus = all(cart, '#skuSelection .expand-view-item').map((item) => {
+        const priceStock = all(item, '.item-price-stock');
+        return {
+            size: text(one(item, '.item-label')),
+            price: text(priceStock[0]),
+            stock: text(priceStock[1]),
+        };
+    });
+
+    // ---- Categories ----
+    const breadcrumbs = all(document, '.breadcrumb a').map(text).filter(Boolean);
+
+    return {
+        reviews: {
+            found: !!evaluation,
+            rating: text(reviewHl[0]),
+            positive_rate: text(reviewHl[1]),
+            total_reviews: reviewCount ? reviewCount.getAttribute('data-value') : null,
+        },
+        attributes,
+        packing,
+        description: { images, price_desc: priceDesc },
+        productTitle: {
+            title: text(one(titleRoot, 'h1')),
+            rating: text(one(titleRoot, '.hl')) || '0.0',
+            reviews: text(one(titleRoot, '.brackets')) || '0',
+            total_sales: sales.length > 1 ? text(sales[1]) : '0',
+        },
+        cart: {
+            price_range: all(cart, '#mainPrice .price-info span').map((el) => el.innerText).join(''),
+            min_order: text(one(cart, '#mainPrice')),
+            services: all(cart, '#mainServices .service-item-link').map(text),
+            shipping_from: text(one(cart, '#shippingServices .location')),
+            skus,
+        },
+        categories: {
+            category: breadcrumbs.length > 1 ? breadcrumbs[1] : '',
+            sub_category: breadcrumbs.length > 2 ? breadcrumbs[2] : '',
+            item_name: text(one(titleRoot, 'h1')),
+        },
+    };
+}
+"""
+
+
+# Sections the single-pass extraction reads, as the per-section extractors waited for them
+LAZY_SECTIONS = ("#productEvaluation", "#productAttributes", "#productPackInfo", ".price-indication")
+SECTION_WAIT_TIMEOUT_MS = 5000
+
+
+async def extract_product_details_in_page(page):
+    """
+    Extract reviews, attributes, packing, description, title/cart and SKUs
+    with a single page.evaluate call instead of one locator round trip per field.
+    :param page: playwright.async_api.Page
+    :return: dict
+    """
+    await page.wait_for_selector("#productTitle")
+
+    # Sections render lazily; give each a short, concurrent wait.  Offers
+    # without one of them just time out and extract as empty.
+    await asyncio.gather(
+        *(page.wait_for_selector(selector, timeout=SECTION_WAIT_TIMEOUT_MS) for selector in LAZY_SECTIONS),
+        return_exceptions=True,
+    )
+
+    # Expand all attributes if collapsed
+    expand_btn = page.locator("#productAttributes .collapse-footer button")
+    if await expand_btn.count() > 0:
+        await expand_btn.click()
+
+    return await page.evaluate(DETAIL_EXTRACTION_SCRIPT)
+
+
+async def save_images(image_urls, save_dir):
+    """Download images concurrently, skipping any that fail."""
+    results = await asyncio.gather(
+        *(asyncio.to_thread(save_image_from_url, url, save_dir) for url in image_urls),
+        return_exceptions=True,
+    )
+
+    saved = []
+    for url, result in zip(image_urls, results):
+        if isinstance(result, Exception):
+            print(f"Could not save image {url}: {result}")
+            continue
+        saved.append(result)
+    return saved
+
+
 async def parse_product_details(page, requests):
     """Extract product details from 1688 product detail page"""
 
-    # try:
+    extracted = await extract_product_details_in_page(page)
+
+    reviews = extracted["reviews"]
+    if reviews["found"] and reviews["rating"]:
+        summary = {
+            "rating": reviews["rating"],
+            "total_reviews": parse_count(reviews["total_reviews"]),
+            "positive_rate": reviews["positive_rate"],
+        }
+    else:
+        summary = {"rating": "0.0", "total_reviews": 0, "positive_rate": "0%"}
+
+    description_images = await save_images(
+        extracted["description"]["images"],
+        f"{utils_file.get_project_url(requests)}assets/images/description_images",
+    )
+
     data = {
-        "extract_product_reviews": await extract_product_reviews(page),
-        "extract_product_attributes": await extract_product_attributes(page),
-        "extract_product_packing": await extract_product_packing(page),
-        "extract_product_description": await extract_product_description(page, requests),
-        "extract_product_title_and_cart": await extract_product_title_and_cart(page, requests),
+        "extract_product_reviews": {"summary": summary},
+        "extract_product_attributes": extracted["attributes"],
+        "extract_product_packing": extracted["packing"],
+        "extract_product_description": {
+            "images": description_images,
+            "html": None,
+            "price_desc": extracted["description"]["price_desc"],
+        },
+        "extract_product_title_and_cart": {
+            "productTitle": extracted["productTitle"],
+            "cart": extracted["cart"],
+        },
         "extract_product_variants": await extract_product_variants(page, requests),
-        "extract_categories": await extract_categories(page),
+        "extract_categories": extracted["categories"],
     }
 
     return data
@@ -557,10 +839,11 @@ async def collect_product_details(page, url, product_id, browser, context, reque
 
 
         details = await parse_product_details(page, request)
-        await db.products.update_one(
-            {"offer_id": product_id},
-            {"$set": {"details": details}},
-            upsert=True
+        now = time.time()
+        fields = {"scraped_at": now, **normalize_details(details)}
+        await upsert_changed_details(db.products, db.product_details, product_id, details, fields, now)
+        await price_history.record_snapshot(
+            product_id, *snapshot_from_variants(details["extract_product_variants"])
         )
         await context.close()
         await browser.close()
@@ -0,0 +1,130 @@
+"""
+Numeric fields derived from scraped text, written at ingest so listings can
+filter and sort on indexed numbers instead of strings:
+
+    price_float   2310.0   from price.amount + price.unit ("2310" + ".00")
+    rating_num    4.8      from "4.8"
+    sold_count    12000    from "1.2万+ sold", "200+ sold", "3k+"
+    moq_num       2        from "≥2 pieces", "2件起批"
+
+The snapshot_* helpers pull (price, stock) samples for utils.price_history.
+"""
+import re
+
+
+def parse_price(value) -> float | None:
+    """Pull the first number out of values like '2310.00', '¥12.5' or '2310.00-2580.00'."""
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = re.search(r'\d+(?:\.\d+)?', str(value).replace(',', ''))
+    return float(match.group(0)) if match else None
+
+
+def snapshot_from_listing(product: dict) -> tuple[float | None, list]:
+    price = product.get("price") or {}
+    if product.get("price_float") is not None:
+        return product["price_float"], []
+    return parse_price(f"{price.get('amount') or ''}{price.get('unit') or ''}"), []
+
+
+def snapshot_from_context(details: dict) -> tuple[float | None, list]:
+    """Lowest SKU price and per-SKU stock from a window.context result blob."""
+    global_data = ((details or {}).get("global") or {}).get("globalData") or {}
+    sku_info_map = (global_data.get("skuModel") or {}).get("skuInfoMap") or {}
+
+    prices, stock = [], []
+    for key, sku in sku_info_map.items():
+        price = parse_price(sku.get("discountPrice") or sku.get("price"))
+        if price is not None:
+            prices.append(price)
+        qty = parse_price(sku.get("canBookCount"))
+        if qty is not None:
+            stock.append({"sku": str(sku.get("skuId") or key), "qty": int(qty)})
+
+    if prices:
+        return min(prices), stock
+
+    trade_model = (global_data.get("model") or {}).get("tradeModel") or {}
+    return parse_price(trade_model.get("priceDisplay")), stock
+
+
+def snapshot_from_variants(variants: list) -> tuple[float | None, list]:
+    """Lowest price and per-SKU stock from extract_product_variants output."""
+    prices, stock = [], []
+    for variant in variants or []:
+        for size in variant.get("sizes", []):
+            price = parse_price(size.get("price"))
+            if price is not None:
+                prices.append(price)
+            qty = parse_price(size.get("stock"))
+            if qty is not None:
+                stock.append({"sku": f"{variant.get('color_name', '')}/{size.get('size_name', '')}", "qty": int(qty)})
+    return (min(prices) if prices else None), stock
+
+
+_NUMBER = re.compile(r'(\d+(?:\.\d+)?)\s*(万|w|k|千)?', re.IGNORECASE)
+_MULTIPLIERS = {'万': 10_000, 'w': 10_000, 'k': 1_000, '千': 1_000}
+
+
+def parse_count(value) -> int | None:
+    """First number in ``value``, with 万/k style multipliers applied."""
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    match = _NUMBER.search(str(value).replace(',', ''))
+    if not match:
+        return None
+    multiplier = _MULTIPLIERS.get((match.group(2) or '').lower(), 1)
+    return int(float(match.group(1)) * multiplier)
+
+
+def parse_rating(value) -> float | None:
+    rating = parse_price(value)
+    if rating is None or not 0 <= rating <= 5:
+        return None
+    return rating
+
+
+def _numeric(**fields) -> dict:
+    return {key: value for key, value in fields.items() if value is not None}
+
+
+def normalize_listing(product: dict) -> dict:
+    """Numeric fields for a parse_product_card result."""
+    price = product.get('price') or {}
+    return _numeric(
+        price_float=parse_price(f"{price.get('amount') or ''}{price.get('unit') or ''}"),
+        rating_num=parse_rating(product.get('rating')),
+        sold_count=parse_count(product.get('sold')),
+        moq_num=parse_count(product.get('moq')),
+    )
+
+
+def normalize_context(details: dict) -> dict:
+    """Numeric fields for a window.context result blob (sync detail scraper)."""
+    global_data = ((details or {}).get('global') or {}).get('globalData') or {}
+    trade_model = (global_data.get('model') or {}).get('tradeModel') or {}
+    return _numeric(
+        price_float=snapshot_from_context(details)[0],
+        sold_count=parse_count(trade_model.get('saleCount')),
+        moq_num=parse_count(trade_model.get('beginAmount')),
+    )
+
+
+def normalize_details(details: dict) -> dict:
+    """Numeric fields for a parse_product_details result (async detail scraper)."""
+    summary = ((details or {}).get('extract_product_reviews') or {}).get('summary') or {}
+    prices = [
+        parse_price(size.get('price'))
+        for variant in details.get('extract_product_variants') or []
+        for size in variant.get('sizes', [])
+    ]
+    prices = [price for price in prices if price is not None]
+    return _numeric(
+        price_float=min(prices) if prices else None,
+        # "0.0" is the placeholder for offers without reviews
+        rating_num=parse_rating(summary.get('rating')) if summary.get('total_reviews') else None,
+    )
@@ -0,0 +1,236 @@
+"""Pool of pre-warmed Playwright pages for interactive detail scrapes.
+
+Every page in the pool already carries the session cookies, the extra request
+headers and the resource-blocking route, and has completed a warm-up
+navigation to 1688.  A scrape can therefore start its real navigation
+immediately instead of paying for browser launch and cookie setup first.
+
+Sync Playwright objects may only be used from the thread that created them,
+and a persistent profile can only be opened by one browser at a time.  The
+pool therefore runs PAGE_POOL_SIZE workers, each with its own thread,
+Playwright instance and per-process profile directory, so scrapes run in
+parallel.
+"""
+import os
+import asyncio
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+from playwright.sync_api import sync_playwright
+
+from scriping_files.browser import (
+    clear_browser_data,
+    destroy_browser_profile,
+    forget_page,
+    launch_browser,
+    setup_resource_blocking,
+)
+from scriping_files.config import (
+    CHECK_PROXY_FIRST,
+    NAVIGATION_TIMEOUT_MS,
+    PAGE_POOL_SIZE,
+    PAGE_POOL_WARMUP_URL,
+    PROXY_CHECK_URL,
+    USER_DATA_DIR,
+)
+from scriping_files.cookies import load_saved_cookies, set_1688_cookies
+
+EXTRA_HTTP_HEADERS = {'accept-language': 'zh-CN,zh;q=0.9,en;q=0.8'}
+
+
+def prepare_page(page) -> None:
+    """Install the headers and route handlers every scrape page needs."""
+    page.set_extra_http_headers(EXTRA_HTTP_HEADERS)
+    setup_resource_blocking(page)
+
+
+class _PageWorker:
+    """One browser context with a warm page, owned by a single thread."""
+
+    def __init__(self, index: int):
+        self.index = index
+        # Own profile per process and worker: uvicorn workers each run a pool,
+        # and the non-pooled scraper keeps USER_DATA_DIR
+        self.user_data_dir = f'{USER_DATA_DIR}-pool-{os.getpid()}-{index}'
+        self.size = 1
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f'page-pool-{index}')
+        self._playwright = None
+        self._context = None
+        self._idle: deque = deque()
+
+    # ── Worker-thread side ─────────────────────────────────────────────────────
+
+    def _ensure_context(self) -> None:
+        if self._context is not None:
+            return
+        if self._playwright is None:
+            self._playwright = sync_playwright().start()
+
+        self._context = launch_browser(self._playwright, self.user_data_dir)
+        # A persistent context opens with one blank page – reuse it.
+        page = self._context.pages[0] if self._context.pages else self._context.new_page()
+        prepare_page(page)
+
+        # Cookies live on the context, so they only need loading once.
+        load_saved_cookies(page)
+        set_1688_cookies(page)
+
+        if CHECK_PROXY_FIRST:
+            try:
+                page.goto(PROXY_CHECK_URL, wait_until='domcontentloaded', timeout=NAVIGATION_TIMEOUT_MS)
+                location = page.inner_text('body', timeout=10_000).strip().replace('\n', ' ')
+                print(f'Proxy location: {location}')
+            except Exception as exc:
+                print(f'Proxy check failed: {exc}')
+
+        self._warm_up(page)
+        self._idle.append(page)
+
+    def _warm_up(self, page) -> None:
+        try:
+            page.goto(PAGE_POOL_WARMUP_URL, wait_until='domcontentloaded', timeout=NAVIGATION_TIMEOUT_MS)
+        except Exception as exc:
+            print(f'Warm-up navigation failed: {exc}')
+
+    def _new_page(self):
+        page = self._context.new_page()
+        prepare_page(page)
+        self._warm_up(page)
+        return page
+
+    def _fill(self) -> None:
+        try:
+            self._ensure_context()
+            while len(self._idle) < self.size:
+                self._idle.append(self._new_page())
+            print(f'Page pool worker {self.index} ready: {len(self._idle)} warm page(s).')
+        except Exception as exc:
+            print(f'Could not fill page pool worker {self.index}: {exc}')
+
+    def _forget_pages(self) -> None:
+        if self._context is not None:
+            for page in self._context.pages:
+                forget_page(page)
+
+    def _reset(self) -> None:
+        """Throw away the whole context, e.g. after a verification wall."""
+        self._idle.clear()
+        self._forget_pages()
+        if self._context is not None:
+            clear_browser_data(self._context)
+            try:
+                self._context.close()
+            except Exception:
+                pass
+            self._context = None
+        destroy_browser_profile(self.user_data_dir)
+
+    def _run(self, job: Callable, discard_on: tuple):
+        self._ensure_context()
+        page = self._idle.popleft() if self._idle else self._new_page()
+        try:
+            result = job(page)
+        except discard_on:
+            self._reset()
+            raise
+        except Exception:
+            # Page state is unknown after a failure – never hand it out again.
+            try:
+                page.close()
+            except Exception:
+                pass
+            raise
+        else:
+            self._idle.append(page)
+            return result
+        finally:
+            # Recycled or closed, the page's allowed URL no longer applies
+            forget_page(page)
+            # Queued behind this job, so the refill never delays the caller.
+            self._executor.submit(self._fill)
+
+    def _close(self) -> None:
+        self._idle.clear()
+        self._forget_pages()
+        if self._context is not None:
+            try:
+                self._context.close()
+            except Exception:
+                pass
+            self._context = None
+        if self._playwright is not None:
+            self._playwright.stop()
+            self._playwright = None
+        # Profiles are per process, so nothing else will reopen this one
+        destroy_browser_profile(self.user_data_dir)
+
+    # ── Async API ──────────────────────────────────────────────────────────────
+
+    async def start(self) -> None:
+        await asyncio.get_running_loop().run_in_executor(self._executor, self._fill)
+
+    async def run(self, job: Callable, discard_on: tuple):
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor, self._run, job, discard_on,
+        )
+
+    async def close(self) -> None:
+        await asyncio.get_running_loop().run_in_executor(self._executor, self._close)
+        self._executor.shutdown(wait=False)
+
+
+class PagePool:
+    def __init__(self, size: int = PAGE_POOL_SIZE):
+        self.size = max(1, size)
+        self._workers = [_PageWorker(index) for index in range(self.size)]
+        self._available: asyncio.Queue | None = None
+        self._task: asyncio.Task | None = None
+
+    def _queue(self) -> asyncio.Queue:
+        if self._available is None:
+            self._available = asyncio.Queue()
+            for worker in self._workers:
+                self._available.put_nowait(worker)
+        return self._available
+
+    def start(self) -> None:
+        """Warm every worker in the background so startup is not delayed."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._warm())
+            self._task.add_done_callback(self._warm_done)
+
+    async def _warm(self) -> None:
+        await asyncio.gather(*(worker.start() for worker in self._workers))
+
+    @staticmethod
+    def _warm_done(task: asyncio.Task) -> None:
+        if not task.cancelled() and task.exception() is not None:
+            print(f'Page pool warm-up failed: {task.exception()}')
+
+    async def run(self, job: Callable, discard_on: tuple = ()):
+        """
+        Run ``job(page)`` on a warm page of the next free worker.
+
+        Exceptions listed in ``discard_on`` tear down that worker's browser
+        context so its next scrape starts from a fresh profile.
+        """
+        available = self._queue()
+        worker = await available.get()
+        try:
+            return await worker.run(job, discard_on)
+        finally:
+            available.put_nowait(worker)
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._task = None
+        await asyncio.gather(*(worker.close() for worker in self._workers))
+
+
+page_pool = PagePool()
@@ -8,11 +8,14 @@ scrape_details_page1688(product_id, request)  – async entry point
 
 import asyncio
 import json
+import re
 import time
+from urllib.parse import urlparse
 from pathlib import Path
 
 from playwright.sync_api import TimeoutError as PlaywrightTimeoutError, sync_playwright
 from scriping_files.extract_context_json import extract_context_json_sync
+from scriping_files.normalize import normalize_context, snapshot_from_context
 
 from scriping_files.browser import (
     clear_browser_data,
@@ -20,7 +23,6 @@ from scriping_files.browser import (
     launch_browser,
     pop_blocked_redirect,
     register_allowed_url,
-    setup_resource_blocking,
 )
 
 from scriping_files.config import (
@@ -30,6 +32,7 @@ from scriping_files.config import (
     CART_WAIT_TIMEOUT_MS,
     CHECK_PRODUCT_EXISTS,
     CHECK_PROXY_FIRST,
+    DETAIL_BASE_URL,
     HTML_OUTPUT_DIR,
     JSON_OUTPUT_DIR,
     KEEP_BROWSER_OPEN,
@@ -37,6 +40,7 @@ from scriping_files.config import (
     NAVIGATION_TIMEOUT_MS,
     PRODUCT_NOT_FOUND_KEYWORDS,
     PROXY_CHECK_URL,
+    USE_PAGE_POOL,
     VERIFICATION_CHECK_DELAY_MS,
 )
 from scriping_files.cookies import (
@@ -45,6 +49,9 @@ from scriping_files.cookies import (
     save_page_cookies,
     set_1688_cookies,
 )
+from scriping_files.page_pool import page_pool, prepare_page
+from scriping_files.change_detection import upsert_changed_details
+from utils import price_history
 
 try:
     from database import db
@@ -70,18 +77,25 @@ class PageRedirectBlockedError(Exception):
 
 # ── URL helpers ────────────────────────────────────────────────────────────────
 
+_PRODUCT_PATH = re.compile(r'^/offer/\d+\.html$')
+
+
 def is_product_url(url: str) -> bool:
-    return 'detail.1688.com/offer/' in url and url.endswith('.html')
+    """Host and path match the detail site; scheme, port, query and fragment are ignored."""
+    parsed = urlparse(url)
+    return (
+        (parsed.hostname or '').lower() == urlparse(DETAIL_BASE_URL).hostname
+        and bool(_PRODUCT_PATH.match(parsed.path))
+    )
 
 
 def get_product_id(url: str) -> str:
-    import re
     m = re.search(r'/offer/(\d+)\.html', url)
     return m.group(1) if m else 'unknown'
 
 
 def _product_url(product_id) -> str:
-    return f'https://detail.1688.com/offer/{product_id}.html'
+    return f'{DETAIL_BASE_URL}/offer/{product_id}.html'
 
 
 def _html_path(url: str) -> str:
@@ -208,45 +222,50 @@ def _save_html(page, product_url: str) -> str:
 
 # ── Sync core ──────────────────────────────────────────────────────────────────
 
+def _scrape_page(page, product_id) -> dict:
+    """Run the scrape steps on a page that already has cookies and routes installed."""
+    product_url = _product_url(product_id)
+
+    _check_product_exists(page, product_url)
+    _open_product_page(page, product_url)
+
+    html_path = _save_html(page, product_url)
+    save_page_cookies(page, product_url)
+
+    # Extract structured JSON from rendered HTML
+    Path(JSON_OUTPUT_DIR).mkdir(parents=True, exist_ok=True)
+    # json_out  = extract_context_json(html_path, _json_path(product_url))
+    # json_out  = asyncio.run(extract_context_json(html_path, _json_path(product_url)))
+    json_out = extract_context_json_sync(html_path, _json_path(product_url))
+    json_data = None
+
+    if json_out and Path(json_out).exists():
+        with open(json_out, encoding='utf-8') as fh:
+            json_data = json.load(fh)
+        Path(json_out).unlink(missing_ok=True)   # keep only DB copy
+        print(f'Extracted & cleaned up: {json_out}')
+
+    return {
+        'product_id': product_id,
+        'cookies':    page.context.cookies([product_url]),
+        'html_path':  html_path,
+        'json_data':  json_data,
+    }
+
+
 def _scrape_sync(product_id) -> dict:
-    product_url       = _product_url(product_id)
     verification_hit  = False
 
     with sync_playwright() as pw:
         context = launch_browser(pw)
         page    = context.new_page()
-        page.set_extra_http_headers({'accept-language': 'zh-CN,zh;q=0.9,en;q=0.8'})
-        setup_resource_blocking(page)
+        prepare_page(page)
 
         try:
             load_saved_cookies(page)
             set_1688_cookies(page)
             _check_proxy(page)
-            _check_product_exists(page, product_url)
-            _open_product_page(page, product_url)
-
-            html_path = _save_html(page, product_url)
-            save_page_cookies(page, product_url)
-
-            # Extract structured JSON from rendered HTML
-            Path(JSON_OUTPUT_DIR).mkdir(parents=True, exist_ok=True)
-            # json_out  = extract_context_json(html_path, _json_path(product_url))
-            # json_out  = asyncio.run(extract_context_json(html_path, _json_path(product_url)))
-            json_out = extract_context_json_sync(html_path, _json_path(product_url))
-            json_data = None
-
-            if json_out and Path(json_out).exists():
-                with open(json_out, encoding='utf-8') as fh:
-                    json_data = json.load(fh)
-                Path(json_out).unlink(missing_ok=True)   # keep only DB copy
-                print(f'Extracted & cleaned up: {json_out}')
-
-            return {
-                'product_id': product_id,
-                'cookies':    page.context.cookies([product_url]),
-                'html_path':  html_path,
-                'json_data':  json_data,
-            }
+            return _scrape_page(page, product_id)
 
         except Exception as exc:
             verification_hit = isinstance(exc, VerificationPageError)
@@ -266,19 +285,18 @@ def _scrape_sync(product_id) -> dict:
 # ── DB persistence ─────────────────────────────────────────────────────────────
 
 async def _save_to_db(product_id, cookies, html_path: str, json_data) -> None:
-    doc = {
+    now = time.time()
+    fields = {
         'offer_id':   str(product_id),
         'is_details_page': True,
-        'details':    json_data.get("result", {}) if json_data else {},
         'url':        _product_url(product_id),
-        'scraped_at': time.time(),
+        'scraped_at': now,
         'status':     'success',
     }
-    result = await db.products.update_one(
-        {'offer_id': str(product_id)},
-        {'$set': doc},
-        upsert=True,
-    )
+    details = json_data.get("result", {}) if json_data else {}
+    fields.update(normalize_context(details))
+    result = await upsert_changed_details(db.products, db.product_details, str(product_id), details, fields, now)
+    await price_history.record_snapshot(product_id, *snapshot_from_context(details))
     print(f'✓ DB upsert complete: offer_id={product_id}')
     return result
 
@@ -289,11 +307,17 @@ async def scrape_details_page1688(product_id, request=None):
     """
     Run the synchronous Playwright scraper in a thread pool so it never
     blocks the asyncio event loop, then persist results via Motor (async).
-    """
-
 
-
-    result = await asyncio.to_thread(_scrape_sync, product_id)
+    With USE_PAGE_POOL enabled the scrape runs on a pre-warmed page and
+    skips browser launch, cookie loading and the proxy check.
+    """
+    if USE_PAGE_POOL:
+        result = await page_pool.run(
+            lambda page: _scrape_page(page, product_id),
+            discard_on=(VerificationPageError,),
+        )
+    else:
+        result = await asyncio.to_thread(_scrape_sync, product_id)
     if result:
         await _save_to_db(
             result['product_id'],
@@ -3,11 +3,16 @@
 import asyncio
 import json
 import os
+import time
 import random
 from urllib.parse import urlparse, parse_qs
 from playwright.async_api import async_playwright
 from dotenv import load_dotenv
 from utils import utils as utils_file
+from utils import price_history
+from scriping_files.config import SEARCH_BASE_URL
+from scriping_files.change_detection import build_fields_update
+from scriping_files.normalize import normalize_listing, snapshot_from_listing
 
 load_dotenv()
 
@@ -244,19 +249,22 @@ async def extract_products_from_page(page, browser, context, requests):
                     raise e
 
         cards = await page.query_selector_all("a.i18n-card-wrap")
+        snapshots = []
 
         for card in cards:
             product = await parse_product_card(card, requests)
             product_id = product.get("offer_id")
+            numeric = normalize_listing(product)
+            product.update(numeric)
 
-            query = {
-                "$or": [
-                    {"offer_id": {"$regex": product_id, "$options": "i"}},
-                ]
-            }
+            # Record the observed price even for offers we already have
+            snapshots.append((product_id, *snapshot_from_listing(product)))
 
-            total = await db.products.count_documents(query)
-            if total > 0:
+            if await db.products.count_documents({"offer_id": product_id}, limit=1):
+                # Keep sales/rating/price numbers current for offers we already have,
+                # marking the offer changed for incremental exports when they move
+                if numeric:
+                    await db.products.update_one({"offer_id": product_id}, build_fields_update(numeric, time.time()))
                 print(f"Product with offer_id {product_id} already exists. Skipping.")
                 continue
 
@@ -265,7 +273,9 @@ async def extract_products_from_page(page, browser, context, requests):
             # product.update(await parse_categories(page))
             data = jsonable_encoder(product)
             if product:
-                db.products.insert_one(data)
+                await db.products.insert_one(data)
+
+        await price_history.record_snapshots(snapshots)
 
         # Add random delay to mimic human behavior
         await asyncio.sleep(random.randint(2, 5))
@@ -290,7 +300,7 @@ async def extract_products_from_page(page, browser, context, requests):
 
 
 async def process_item(page, searching_key, browser, context, requests):
-    url = f"https://s.1688.com/selloffer/offer_search.htm?charset=utf8&keywords={searching_key}"
+    url = f"{SEARCH_BASE_URL}/selloffer/offer_search.htm?charset=utf8&keywords={searching_key}"
     for attempt in range(3):
         try:
             await page.goto(url, timeout=60000)
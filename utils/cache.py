@@ -0,0 +1,67 @@
+import copy
+import time
+from collections import OrderedDict
+
+
+# Every cache registers itself so admin writes can drop them all at once
+_caches: list["TTLCache"] = []
+
+
+class TTLCache:
+    """
+    Small in-process LRU cache whose entries expire after ``ttl`` seconds.
+
+    Lives per worker process; the TTL bounds how stale another worker's
+    copy can get after an invalidation.  With ``copies`` values are copied
+    in and out, so callers that mutate what they get can't corrupt it.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0, copies: bool = False):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.copies = copies
+        self._data: OrderedDict = OrderedDict()
+        _caches.append(self)
+
+    def get(self, key, default=None):
+        item = self._data.get(key)
+        if item is None:
+            return default
+
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return default
+
+        self._data.move_to_end(key)
+        return copy.deepcopy(value) if self.copies else value
+
+    def set(self, key, value) -> None:
+        if self.copies:
+            value = copy.deepcopy(value)
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        item = self._data.pop(key, None)
+        return default if item is None else item[1]
+
+    def pop_where(self, predicate) -> int:
+        """Drop every entry for which ``predicate(key, value)`` is true."""
+        keys = [key for key, (_, value) in self._data.items() if predicate(key, value)]
+        for key in keys:
+            del self._data[key]
+        return len(keys)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+def clear_all_caches() -> None:
+    for cache in _caches:
+        cache.clear()
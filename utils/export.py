@@ -0,0 +1,107 @@
+import io
+import os
+import csv
+import json
+import zlib
+from datetime import datetime
+from typing import AsyncIterator
+
+from bson import ObjectId
+
+from dotenv import load_dotenv
+load_dotenv()
+
+
+# Documents per cursor batch for catalog exports
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", 1000))
+# Bytes buffered before a chunk is sent to the client
+EXPORT_CHUNK_BYTES = int(os.getenv("EXPORT_CHUNK_BYTES", 64 * 1024))
+
+
+def _default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, ObjectId):
+        return str(value)
+    return str(value)
+
+
+def to_ndjson(document: dict) -> str:
+    return json.dumps(document, default=_default, ensure_ascii=False) + "\n"
+
+
+def _cell(value):
+    if value is None:
+        return ""
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, default=_default, ensure_ascii=False)
+    return _default(value) if isinstance(value, (datetime, ObjectId)) else value
+
+
+def _resolve(document: dict, field: str):
+    """Value at a dotted path, as Mongo's projection nests it; arrays map over their items."""
+    value = document
+    for part in field.split("."):
+        if isinstance(value, list):
+            value = [item.get(part) for item in value if isinstance(item, dict)]
+        elif isinstance(value, dict):
+            value = value.get(part)
+        else:
+            return None
+    return value
+
+
+async def ndjson_stream(cursor) -> AsyncIterator[str]:
+    async for document in cursor:
+        yield to_ndjson(document)
+
+
+async def csv_stream(cursor, fields: list[str]) -> AsyncIterator[str]:
+    """
+    One header row, then one row per document.  Dotted fields
+    (``price.amount``) are read from the nested document; nested values
+    are JSON encoded.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    writer.writerow(fields)
+    async for document in cursor:
+        writer.writerow([_cell(_resolve(document, field)) for field in fields])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+    # Header of an empty export
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+async def encode_stream(lines: AsyncIterator[str], gzip: bool = False,
+                        chunk_bytes: int = EXPORT_CHUNK_BYTES) -> AsyncIterator[bytes]:
+    """
+    Group lines into chunks of about ``chunk_bytes`` and, with ``gzip``,
+    compress them on the fly (one gzip member, so ``gunzip`` reads it).
+    """
+    compressor = zlib.compressobj(wbits=31) if gzip else None
+    pending, size = [], 0
+
+    def flush() -> bytes:
+        data = "".join(pending).encode("utf-8")
+        pending.clear()
+        return compressor.compress(data) if compressor else data
+
+    async for line in lines:
+        pending.append(line)
+        size += len(line)
+        if size >= chunk_bytes:
+            size = 0
+            data = flush()
+            if data:
+                yield data
+
+    data = flush()
+    if compressor:
+        data += compressor.flush()
+    if data:
+        yield data
@@ -0,0 +1,231 @@
+"""
+Declarative index registry.
+
+Applied in the background at app startup and from the command line:
+
+    python -m utils.indexes apply
+    python -m utils.indexes report            # missing/mismatched indexes + queries they serve
+    python -m utils.indexes report --slow-ms 50
+
+Each entry names the queries it serves, so the report can explain why a
+missing index matters.  If the database profiler is on, ``report`` also
+counts recent slow operations each missing index would cover.
+"""
+import os
+import sys
+import asyncio
+import argparse
+from typing import NamedTuple
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import PyMongoError
+
+from database import db
+
+from dotenv import load_dotenv
+load_dotenv()
+
+
+INDEXES_ON_STARTUP = os.getenv("INDEXES_ON_STARTUP", "1") == "1"
+# OTP documents are dropped this long after they expire
+OTP_TTL_AFTER_EXPIRE = int(os.getenv("OTP_TTL_AFTER_EXPIRE", 3600))
+
+
+class IndexSpec(NamedTuple):
+    collection: str
+    keys: list
+    options: dict
+    serves: str
+
+
+INDEXES: list[IndexSpec] = [
+    # ── Products ───────────────────────────────────────────────────
+    IndexSpec("products", [("offer_id", ASCENDING)], {},
+              "GET /products/{id}, detail scrape upserts by offer_id"),
+    IndexSpec("products", [("category", ASCENDING), ("_id", DESCENDING)], {},
+              "GET /products/?category= sorted by newest"),
+    IndexSpec("products", [("price_float", ASCENDING)], {},
+              "GET /products/ min_price/max_price filters and price sorts"),
+    IndexSpec("products", [("rating_num", DESCENDING)], {},
+              "GET /products/?sort=rating"),
+    IndexSpec("products", [("sold_count", DESCENDING)], {},
+              "GET /products/?sort=sales"),
+    IndexSpec("products", [("moq_num", ASCENDING)], {},
+              "GET /products/ min_moq/max_moq filters"),
+    IndexSpec("products", [("last_changed_at", ASCENDING)], {},
+              "GET /products/export?since= incremental syncs"),
+    IndexSpec("product_details", [("offer_id", ASCENDING)], {"unique": True},
+              "GET /products/{id} details join, detail scrape upserts, migration 0003 $merge"),
+    IndexSpec("product_price_history", [("offer_id", ASCENDING), ("month", ASCENDING)], {"unique": True},
+              "price history upserts and GET /products/{id}/history"),
+
+    # ── Users & credentials ────────────────────────────────────────
+    IndexSpec("User", [("email", ASCENDING)], {"unique": True},
+              "login, JWT user lookup, OTP flows"),
+    IndexSpec("APICredential", [("app_key", ASCENDING)], {"unique": True, "sparse": True},
+              "app-key/secret-key authentication"),
+    IndexSpec("APICredential", [("user_id", ASCENDING)], {},
+              "GET /users/get-secret/, key rotation"),
+    IndexSpec("user_profile", [("user", ASCENDING)], {},
+              "GET /users/me/, profile edits"),
+    IndexSpec("OTP", [("email", ASCENDING), ("otp", ASCENDING)], {},
+              "OTP verification and password reset"),
+    IndexSpec("OTP", [("expire", ASCENDING)], {"expireAfterSeconds": OTP_TTL_AFTER_EXPIRE},
+              "TTL: removes OTPs after they expire (datetime values only)"),
+
+    # ── Metering, quota, rate limits ───────────────────────────────
+    # Unique once migration 0005 has merged duplicate counters
+    IndexSpec("api_hits", [("user_id", ASCENDING), ("endpoint", ASCENDING)], {"unique": True},
+              "hit counter upserts by (endpoint, user_id), GET /users/api-uses/"),
+    IndexSpec("api_usage_rollups",
+              [("user_id", ASCENDING), ("granularity", ASCENDING), ("bucket", ASCENDING), ("endpoint", ASCENDING)],
+              {"unique": True},
+              "rollup upserts, GET /users/api-uses/?granularity="),
+    IndexSpec("user_quota", [("user_id", ASCENDING), ("window_start", ASCENDING)], {"unique": True},
+              "quota sync upserts and reads"),
+    IndexSpec("rate_limits", [("key", ASCENDING), ("window_start", ASCENDING)], {"unique": True},
+              "cross-worker rate limit sync"),
+    IndexSpec("rate_limits", [("expires_at", ASCENDING)], {"expireAfterSeconds": 0},
+              "TTL: drops finished rate limit windows"),
+
+    # ── Subscriptions & billing ────────────────────────────────────
+    IndexSpec("user_subscription", [("user_id", ASCENDING)], {"unique": True},
+              "subscription upserts, quota and rate limit plan lookup"),
+    IndexSpec("subscription_features", [("package_id", ASCENDING)], {},
+              "package catalog $lookup, subscribe flows"),
+    IndexSpec("subscription_invoices", [("user_id", ASCENDING), ("_id", DESCENDING)], {},
+              "GET /invoice/subscription/read/ pages"),
+    IndexSpec("subscription_invoices", [("user_id", ASCENDING), ("created_at", ASCENDING)], {},
+              "GET /invoice/export/ date ranges"),
+    # Partial: pending bKash payments have no transaction id yet (migration 0004 clears old placeholders)
+    IndexSpec("payment_subscribe_invoices", [("transaction_id", ASCENDING)],
+              {"unique": True, "partialFilterExpression": {"transaction_id": {"$type": "string"}}},
+              "duplicate payment check on Stripe confirmation"),
+    IndexSpec("payment_subscribe_invoices", [("user_id", ASCENDING), ("_id", DESCENDING)], {},
+              "GET /payment/transaction/read/ pages"),
+]
+
+
+def _index_name(spec: IndexSpec) -> str:
+    return spec.options.get("name") or "_".join(f"{field}_{direction}" for field, direction in spec.keys)
+
+
+async def apply_indexes(database=db) -> dict:
+    """
+    Create every registered index.  Failures (duplicate data under a unique
+    index, option conflicts, ...) are logged per index and do not stop the rest.
+    """
+    result = {"created": [], "failed": []}
+
+    for spec in INDEXES:
+        name = f"{spec.collection}.{_index_name(spec)}"
+        try:
+            await database[spec.collection].create_indexes([IndexModel(spec.keys, **spec.options)])
+            result["created"].append(name)
+        except PyMongoError as exc:
+            result["failed"].append(name)
+            print(f"Index {name} not applied: {exc}")
+
+    print(f"Indexes: {len(result['created'])} ensured, {len(result['failed'])} failed")
+    return result
+
+
+async def _slow_ops(database, collection: str, field: str, slow_ms: int) -> int:
+    """Recent profiled operations on ``collection`` slower than ``slow_ms`` that filter on ``field``."""
+    try:
+        return await database["system.profile"].count_documents({
+            "ns": f"{database.name}.{collection}",
+            "millis": {"$gte": slow_ms},
+            "$or": [
+                {f"command.filter.{field}": {"$exists": True}},
+                {f"command.q.{field}": {"$exists": True}},
+                {f"command.query.{field}": {"$exists": True}},
+            ],
+        })
+    except PyMongoError:
+        return 0
+
+
+# Options that change what an index enforces or keeps; an index with the
+# right keys but different values here does not do its job
+COMPARED_OPTIONS = ("unique", "sparse", "expireAfterSeconds", "partialFilterExpression")
+
+
+def _compared_options(options: dict) -> dict:
+    return {
+        option: dict(options[option]) if isinstance(options[option], dict) else options[option]
+        for option in COMPARED_OPTIONS
+        if options.get(option) not in (None, False)
+    }
+
+
+async def index_problems(database=db) -> list[tuple[IndexSpec, str]]:
+    """Registered indexes that are absent, or present with other options, and why."""
+    existing: dict[str, dict] = {}
+    problems = []
+
+    for spec in INDEXES:
+        if spec.collection not in existing:
+            info = await database[spec.collection].index_information()
+            existing[spec.collection] = {
+                tuple(tuple(key) for key in index["key"]): _compared_options(index) for index in info.values()
+            }
+
+        options = existing[spec.collection].get(tuple(spec.keys))
+        if options is None:
+            problems.append((spec, "missing"))
+        elif options != _compared_options(spec.options):
+            problems.append((spec, f"options differ: {options}"))
+
+    return problems
+
+
+async def missing_indexes(database=db) -> list[IndexSpec]:
+    return [spec for spec, _ in await index_problems(database)]
+
+
+async def report(database=db, slow_ms: int = 100) -> list[dict]:
+    rows = []
+    for spec, problem in await index_problems(database):
+        rows.append({
+            "collection": spec.collection,
+            "index":      _index_name(spec),
+            "options":    spec.options,
+            "problem":    problem,
+            "serves":     spec.serves,
+            "slow_ops":   await _slow_ops(database, spec.collection, spec.keys[0][0], slow_ms),
+        })
+    return rows
+
+
+def print_report(rows: list[dict], slow_ms: int) -> None:
+    if not rows:
+        print("All registered indexes are present.")
+        return
+
+    print(f"{len(rows)} missing or mismatched indexes (slow ops = profiled operations >= {slow_ms} ms on the leading field)\n")
+    for row in rows:
+        options = f" {row['options']}" if row["options"] else ""
+        print(f"✗ {row['collection']}.{row['index']}{options}")
+        print(f"    problem:  {row['problem']}")
+        print(f"    serves:   {row['serves']}")
+        print(f"    slow ops: {row['slow_ops']}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Apply or report the registered MongoDB indexes.")
+    parser.add_argument("command", choices=["apply", "report"])
+    parser.add_argument("--slow-ms", type=int, default=100, help="threshold for counting profiled slow queries")
+    args = parser.parse_args(argv)
+
+    if args.command == "apply":
+        result = asyncio.run(apply_indexes())
+        return 1 if result["failed"] else 0
+
+    rows = asyncio.run(report(slow_ms=args.slow_ms))
+    print_report(rows, args.slow_ms)
+    return 1 if rows else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,264 @@
+import os
+import json
+import time
+import asyncio
+import zipfile
+import hashlib
+import tempfile
+import multiprocessing
+from pathlib import Path
+from typing import AsyncIterator
+from concurrent.futures import ProcessPoolExecutor
+
+from dotenv import load_dotenv
+load_dotenv()
+
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+TEMPLATES_DIR = BASE_DIR / "templates"
+INVOICE_TEMPLATE = "invoice.html"
+
+INVOICE_PDF_WORKERS = int(os.getenv("INVOICE_PDF_WORKERS", 1))
+# Rendered PDFs, named by content hash; never served from /assets
+INVOICE_PDF_CACHE_DIR = Path(os.getenv("INVOICE_PDF_CACHE_DIR", BASE_DIR / "cache" / "invoices"))
+# Cached PDFs kept on disk; older / least recently used ones are pruned
+INVOICE_PDF_CACHE_MAX_FILES = int(os.getenv("INVOICE_PDF_CACHE_MAX_FILES", 1000))
+INVOICE_PDF_CACHE_MAX_AGE_DAYS = float(os.getenv("INVOICE_PDF_CACHE_MAX_AGE_DAYS", 30))
+# Renders in flight per bulk export
+INVOICE_EXPORT_CONCURRENCY = int(os.getenv("INVOICE_EXPORT_CONCURRENCY", 4))
+
+
+# ── Worker side ────────────────────────────────────────────────────
+# Jinja and weasyprint are only imported inside the pool workers
+
+_template = None
+
+
+def _render(invoice: dict, user: dict, package_data: dict) -> bytes:
+    global _template
+    import jinja2
+    from weasyprint import HTML
+
+    if _template is None:
+        env = jinja2.Environment(loader=jinja2.FileSystemLoader(str(TEMPLATES_DIR)), autoescape=True)
+        _template = env.get_template(INVOICE_TEMPLATE)
+
+    html_content = _template.render(invoice=invoice, user=user, package_data=package_data)
+    return HTML(string=html_content).write_pdf()
+
+
+# ── App side ───────────────────────────────────────────────────────
+
+_digest: tuple[int, str] | None = None
+
+
+def _template_digest() -> str:
+    """Hash of the invoice template, re-read only when its mtime changes."""
+    global _digest
+    path = TEMPLATES_DIR / INVOICE_TEMPLATE
+    mtime = path.stat().st_mtime_ns
+    if _digest is None or _digest[0] != mtime:
+        _digest = (mtime, hashlib.sha256(path.read_bytes()).hexdigest())
+    return _digest[1]
+
+
+def invoice_key(invoice: dict, user: dict, package_data: dict) -> str:
+    """
+    Content hash of everything that ends up in the PDF, including the
+    template, so any edit produces a new key (and a new ETag).
+    """
+    user = {k: v for k, v in (user or {}).items() if k != "password"}
+    payload = json.dumps(
+        {"invoice": invoice, "user": user, "package": package_data, "template": _template_digest()},
+        sort_keys=True, default=str, ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class InvoiceRenderer:
+    """Renders invoice PDFs in a process pool and keeps them on disk by content hash."""
+
+    # Seconds between cache prunes
+    prune_interval = 300
+
+    def __init__(
+        self,
+        workers: int = INVOICE_PDF_WORKERS,
+        cache_dir: Path = INVOICE_PDF_CACHE_DIR,
+        max_files: int = INVOICE_PDF_CACHE_MAX_FILES,
+        max_age_days: float = INVOICE_PDF_CACHE_MAX_AGE_DAYS,
+    ):
+        self.workers = workers
+        self.cache_dir = Path(cache_dir)
+        self.max_files = max_files
+        self.max_age = max_age_days * 86400
+        self._last_prune = 0.0
+        self._executor: ProcessPoolExecutor | None = None
+        # key -> render in progress, so concurrent downloads share one render
+        self._rendering: dict[str, asyncio.Future] = {}
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.pdf"
+
+    def cached(self, key: str) -> bytes | None:
+        path = self._path(key)
+        try:
+            pdf_bytes = path.read_bytes()
+        except FileNotFoundError:
+            return None
+        # mtime doubles as last use, so pruning drops cold invoices first
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return pdf_bytes
+
+    def _store(self, key: str, pdf_bytes: bytes) -> None:
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        # A unique temp file per writer, so concurrent renders of one key can't interleave
+        with tempfile.NamedTemporaryFile(dir=self.cache_dir, prefix=f"{key}.", suffix=".tmp",
+                                         delete=False) as tmp:
+            tmp.write(pdf_bytes)
+        try:
+            os.replace(tmp.name, self._path(key))
+        except OSError:
+            os.unlink(tmp.name)
+            raise
+
+        if time.monotonic() - self._last_prune >= self.prune_interval:
+            self._last_prune = time.monotonic()
+            self.prune()
+
+    def prune(self) -> int:
+        """Drop PDFs unused for ``max_age``, then the least recently used beyond ``max_files``."""
+        entries = []
+        for path in self.cache_dir.glob("*.pdf"):
+            try:
+                entries.append((path.stat().st_mtime, path))
+            except FileNotFoundError:
+                continue
+        entries.sort(reverse=True)
+
+        cutoff = time.time() - self.max_age
+        stale = [path for index, (mtime, path) in enumerate(entries) if mtime < cutoff or index >= self.max_files]
+        for path in stale:
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+        return len(stale)
+
+    async def _render_and_store(self, key: str, invoice: dict, user: dict, package_data: dict) -> bytes:
+        loop = asyncio.get_running_loop()
+        pdf_bytes = await loop.run_in_executor(self._pool(), _render, invoice, user, package_data)
+        await asyncio.to_thread(self._store, key, pdf_bytes)
+        return pdf_bytes
+
+    async def render(self, invoice: dict, user: dict, package_data: dict, key: str | None = None) -> tuple[str, bytes]:
+        """Return ``(key, pdf bytes)``, rendering only on a cache miss."""
+        key = key or invoice_key(invoice, user, package_data)
+
+        pdf_bytes = await asyncio.to_thread(self.cached, key)
+        if pdf_bytes is not None:
+            return key, pdf_bytes
+
+        task = self._rendering.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._render_and_store(key, invoice, user, package_data))
+            self._rendering[key] = task
+            task.add_done_callback(lambda _: self._rendering.pop(key, None))
+        return key, await asyncio.shield(task)
+
+    async def render_many(self, jobs: AsyncIterator[tuple], concurrency: int = INVOICE_EXPORT_CONCURRENCY):
+        """
+        Render ``(name, invoice, user, package_data)`` jobs with at most
+        ``concurrency`` in flight, yielding ``(name, pdf bytes | exception)``
+        as they finish.  Jobs are pulled lazily, so memory stays bounded.
+        """
+        async def run(name, invoice, user, package_data):
+            try:
+                return name, (await self.render(invoice, user, package_data))[1]
+            except Exception as exc:
+                return name, exc
+
+        pending = set()
+        try:
+            async for job in jobs:
+                pending.add(asyncio.ensure_future(run(*job)))
+                if len(pending) >= concurrency:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        yield task.result()
+
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield task.result()
+        finally:
+            # Client went away mid-export
+            for task in pending:
+                task.cancel()
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+
+class _ZipStream:
+    """Write-only, unseekable sink; zipfile then emits data descriptors as it goes."""
+
+    def __init__(self):
+        self._chunks: list[bytes] = []
+        self._position = 0
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+async def stream_zip(files: AsyncIterator[tuple[str, bytes | Exception]]) -> AsyncIterator[bytes]:
+    """
+    Stream a ZIP of ``(name, pdf bytes)`` pairs, one entry at a time.
+
+    PDFs are already compressed, so entries are stored.  Failed renders are
+    listed in ``errors.txt`` instead of aborting the download.
+    """
+    sink = _ZipStream()
+    errors = []
+
+    with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_STORED) as archive:
+        async for name, pdf_bytes in files:
+            if isinstance(pdf_bytes, Exception):
+                errors.append(f"{name}: {pdf_bytes}")
+                continue
+            archive.writestr(name, pdf_bytes)
+            yield sink.drain()
+
+        if errors:
+            archive.writestr("errors.txt", "\n".join(errors) + "\n")
+
+    yield sink.drain()
+
+
+invoice_renderer = InvoiceRenderer()
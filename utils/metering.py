@@ -0,0 +1,125 @@
+import os
+import asyncio
+from datetime import datetime
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from database import db
+
+from dotenv import load_dotenv
+load_dotenv()
+
+
+API_HIT_FLUSH_INTERVAL = float(os.getenv("API_HIT_FLUSH_INTERVAL", 5))
+
+
+class ApiHitBuffer:
+    """
+    Accumulates API hits in memory and flushes them as unordered bulk_writes
+    of ``$inc`` upserts:
+
+    - ``api_hits``: lifetime total per (user, endpoint)
+    - ``api_usage_rollups``: hits per (user, endpoint, hour) and (user, endpoint, day)
+
+    Recording a hit is a few dict updates, so metering adds no I/O to the request.
+    """
+
+    def __init__(self, flush_interval: float = API_HIT_FLUSH_INTERVAL):
+        self.flush_interval = flush_interval
+        self._totals: dict[tuple, int] = {}
+        self._rollups: dict[tuple, int] = {}
+        self._task: asyncio.Task | None = None
+        self._stopping = asyncio.Event()
+
+    @staticmethod
+    def _bump(counts: dict, key: tuple, hits: int = 1) -> None:
+        counts[key] = counts.get(key, 0) + hits
+
+    def record(self, endpoint: str, user_id, ts: datetime | None = None) -> None:
+        hour = (ts or datetime.utcnow()).replace(minute=0, second=0, microsecond=0)
+        self._bump(self._totals, (user_id, endpoint))
+        self._bump(self._rollups, (user_id, endpoint, "hour", hour))
+        self._bump(self._rollups, (user_id, endpoint, "day", hour.replace(hour=0)))
+
+    @staticmethod
+    def _total_op(key: tuple, hits: int, now: datetime) -> UpdateOne:
+        user_id, endpoint = key
+        return UpdateOne(
+            {"endpoint": endpoint, "user_id": user_id},
+            {
+                "$inc": {"total_hits": hits},
+                "$set": {"updated_at": now},
+                "$setOnInsert": {"created_at": now},
+            },
+            upsert=True,
+        )
+
+    @staticmethod
+    def _rollup_op(key: tuple, hits: int, now: datetime) -> UpdateOne:
+        user_id, endpoint, granularity, bucket = key
+        return UpdateOne(
+            {"user_id": user_id, "granularity": granularity, "bucket": bucket, "endpoint": endpoint},
+            {
+                "$inc": {"hits": hits},
+                "$set": {"updated_at": now},
+            },
+            upsert=True,
+        )
+
+    async def _write(self, collection, counts: dict, pending: dict, build_op, now: datetime) -> int:
+        if not counts:
+            return 0
+
+        keys = list(counts)
+        ops = [build_op(key, counts[key], now) for key in keys]
+
+        try:
+            await collection.bulk_write(ops, ordered=False)
+        except BulkWriteError as exc:
+            # Only the failed upserts are retried; the rest were applied
+            failed = {keys[err["index"]] for err in exc.details.get("writeErrors", [])}
+            for key in failed:
+                self._bump(pending, key, counts[key])
+            print(f"{collection.name} flush: {len(failed)} of {len(ops)} upserts failed, retrying next flush")
+        except Exception as exc:
+            for key, hits in counts.items():
+                self._bump(pending, key, hits)
+            print(f"{collection.name} flush failed, retrying next flush: {exc}")
+            return 0
+
+        return len(ops)
+
+    async def flush(self) -> int:
+        # Swap first so hits recorded during the write land in the next batch
+        totals, self._totals = self._totals, {}
+        rollups, self._rollups = self._rollups, {}
+        now = datetime.utcnow()
+
+        written = await self._write(db.api_hits, totals, self._totals, self._total_op, now)
+        written += await self._write(db.api_usage_rollups, rollups, self._rollups, self._rollup_op, now)
+        return written
+
+    async def _run(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                await self.flush()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._stopping.clear()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        # Cancelling mid-bulk_write would lose the counts already swapped out,
+        # so let the loop finish its flush, then write what is left
+        if self._task is not None:
+            self._stopping.set()
+            await self._task
+            self._task = None
+        await self.flush()
+
+
+api_hit_buffer = ApiHitBuffer()
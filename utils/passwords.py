@@ -0,0 +1,105 @@
+import os
+import time
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from fastapi import HTTPException, status
+from pwdlib import PasswordHash
+
+from dotenv import load_dotenv
+load_dotenv()
+
+
+# Kept free of app imports: every pool worker imports this module
+PASSWORD_POOL_WORKERS = int(os.getenv("PASSWORD_POOL_WORKERS", 2))
+# Hash/verify calls allowed to wait for a worker before new ones get 503
+PASSWORD_POOL_MAX_PENDING = int(os.getenv("PASSWORD_POOL_MAX_PENDING", 32))
+
+password_hash = PasswordHash.recommended()
+
+
+def _hash(password: str) -> str:
+    return password_hash.hash(password)
+
+
+def _verify(plain_password: str, hashed_password: str) -> bool:
+    return password_hash.verify(plain_password, hashed_password)
+
+
+class PasswordPool:
+    """
+    Runs Argon2 hashing and verification in a small process pool.
+
+    Argon2 is CPU and memory heavy on purpose; off the event loop, a login
+    burst only queues other logins.  At most ``max_pending`` calls wait at
+    once, the rest are rejected with 503 instead of piling up.
+    """
+
+    def __init__(self, workers: int = PASSWORD_POOL_WORKERS, max_pending: int = PASSWORD_POOL_MAX_PENDING):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor: ProcessPoolExecutor | None = None
+        self._in_flight = 0
+        self._stats = {"completed": 0, "rejected": 0, "failed": 0, "busy_s": 0.0, "max_s": 0.0}
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn, not fork: the parent runs Motor and Playwright threads
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    async def _submit(self, fn, *args):
+        if self._in_flight >= self.max_pending:
+            self._stats["rejected"] += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Authentication is busy, please retry",
+                headers={"Retry-After": "1"},
+            )
+
+        self._in_flight += 1
+        start = time.perf_counter()
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(self._pool(), fn, *args)
+        except Exception:
+            self._stats["failed"] += 1
+            raise
+        finally:
+            self._in_flight -= 1
+            elapsed = time.perf_counter() - start
+            self._stats["busy_s"] += elapsed
+            self._stats["max_s"] = max(self._stats["max_s"], elapsed)
+
+        self._stats["completed"] += 1
+        return result
+
+    async def hash(self, password: str) -> str:
+        return await self._submit(_hash, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._submit(_verify, plain_password, hashed_password)
+
+    def stats(self) -> dict:
+        calls = self._stats["completed"] + self._stats["failed"]
+        return {
+            "workers":     self.workers,
+            "max_pending": self.max_pending,
+            "in_flight":   self._in_flight,
+            "completed":   self._stats["completed"],
+            "rejected":    self._stats["rejected"],
+            "failed":      self._stats["failed"],
+            "mean_ms":     round(self._stats["busy_s"] / calls * 1000, 2) if calls else None,
+            "max_ms":      round(self._stats["max_s"] * 1000, 2),
+        }
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+
+password_pool = PasswordPool()
@@ -0,0 +1,95 @@
+import os
+from datetime import datetime, timedelta, timezone
+
+from pymongo import UpdateOne
+
+from database import db
+
+from dotenv import load_dotenv
+load_dotenv()
+
+
+# Samples kept per offer per month; the oldest are dropped past this
+PRICE_HISTORY_MAX_SAMPLES = int(os.getenv("PRICE_HISTORY_MAX_SAMPLES", 1000))
+
+# One document per offer per calendar month:
+# {offer_id, month, count, first_ts, last_ts, last: {price, stock},
+#  samples: [{ts, price, stock: [{sku, qty}]}]}
+collection = db.product_price_history
+
+
+def month_bucket(ts: datetime) -> datetime:
+    return datetime(ts.year, ts.month, 1)
+
+
+def _sample_update(offer_id, price: float | None, stock: list | None, ts: datetime) -> tuple[dict, list] | None:
+    """
+    Filter and pipeline update appending one sample to the month bucket.
+
+    A sample whose price and stock equal the bucket's last one only moves
+    ``last_ts``; new ones are appended, capped at PRICE_HISTORY_MAX_SAMPLES.
+    """
+    if not offer_id or (price is None and not stock):
+        return None
+
+    observed = {"price": price, "stock": stock or []}
+    sample = {"ts": ts, "price": price}
+    if stock:
+        sample["stock"] = stock
+
+    unchanged = {"$eq": ["$last", {"$literal": observed}]}
+    samples = {"$concatArrays": [{"$ifNull": ["$samples", []]}, [{"$literal": sample}]]}
+
+    return (
+        {"offer_id": str(offer_id), "month": month_bucket(ts)},
+        [{"$set": {
+            "samples": {"$cond": [unchanged, "$samples", {"$slice": [samples, -PRICE_HISTORY_MAX_SAMPLES]}]},
+            "count": {"$cond": [unchanged, "$count", {"$add": [{"$ifNull": ["$count", 0]}, 1]}]},
+            "first_ts": {"$min": ["$first_ts", ts]},
+            "last_ts": {"$max": ["$last_ts", ts]},
+            "last": {"$literal": observed},
+        }}],
+    )
+
+
+async def record_snapshot(offer_id, price: float | None, stock: list | None = None, ts: datetime | None = None):
+    """Record a price/stock sample in the offer's bucket for the month of ``ts``."""
+    update = _sample_update(offer_id, price, stock, ts or datetime.utcnow())
+    if update is None:
+        return None
+    return await collection.update_one(*update, upsert=True)
+
+
+async def record_snapshots(snapshots: list[tuple]) -> None:
+    """Write ``(offer_id, price, stock)`` samples, e.g. a whole listing page, in one bulk_write."""
+    ts = datetime.utcnow()
+    updates = [_sample_update(offer_id, price, stock, ts) for offer_id, price, stock in snapshots]
+    updates = [UpdateOne(*update, upsert=True) for update in updates if update is not None]
+    if updates:
+        await collection.bulk_write(updates, ordered=False)
+
+
+async def read_history(offer_id: str, start: datetime, end: datetime) -> list[dict]:
+    """Samples in [start, end]; touches only the month buckets inside the range."""
+    cursor = collection.find(
+        {"offer_id": str(offer_id), "month": {"$gte": month_bucket(start), "$lte": end}},
+        projection={"_id": 0, "samples": 1},
+    ).sort("month", 1)
+
+    samples = []
+    async for bucket in cursor:
+        samples.extend(s for s in bucket.get("samples", []) if start <= s["ts"] <= end)
+    return samples
+
+
+def _naive_utc(value: datetime | None) -> datetime | None:
+    # Mongo hands back naive UTC datetimes, so compare like with like
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def default_range(start: datetime | None, end: datetime | None, days: int = 30) -> tuple[datetime, datetime]:
+    end = _naive_utc(end) or datetime.utcnow()
+    start = _naive_utc(start) or end - timedelta(days=days)
+    return start, end
@@ -0,0 +1,269 @@
+import os
+import time
+import asyncio
+from datetime import datetime, timezone
+
+from bson import ObjectId
+from fastapi import HTTPException, Response, status
+from pymongo import UpdateOne
+
+from database import db
+
+from dotenv import load_dotenv
+load_dotenv()
+
+
+# product_query_limit applies per package validity period, counted from the
+# subscription's start; this window is used when the package has none
+QUOTA_WINDOW_SECONDS = int(os.getenv("QUOTA_WINDOW_SECONDS", 30 * 24 * 3600))
+# Queries per window for users without a subscription; empty means unlimited
+QUOTA_DEFAULT_LIMIT = int(os.getenv("QUOTA_DEFAULT_LIMIT") or 0) or None
+# How often each worker pushes its local usage to user_quota and pulls the others'
+QUOTA_SYNC_INTERVAL = float(os.getenv("QUOTA_SYNC_INTERVAL", 2))
+# How long a worker trusts a user's product_query_limit before re-reading it
+QUOTA_LIMIT_TTL = float(os.getenv("QUOTA_LIMIT_TTL", 300))
+
+
+class QuotaBucket:
+    __slots__ = ("limit", "anchor", "period", "window_start", "synced", "pending", "loaded_at")
+
+    def __init__(self, limit: int | None, anchor: int, period: int, window_start: int, synced: int,
+                 loaded_at: float):
+        self.limit = limit        # None: no limit, usage is only counted
+        self.anchor = anchor      # subscription start, epoch seconds
+        self.period = period
+        self.window_start = window_start
+        self.synced = synced      # usage across all workers as of the last sync
+        self.pending = 0          # usage in this worker not yet written to Mongo
+        self.loaded_at = loaded_at
+
+    def window_at(self, now: float) -> int:
+        return int(self.anchor + (now - self.anchor) // self.period * self.period)
+
+    @property
+    def remaining(self) -> int | None:
+        if self.limit is None:
+            return None
+        return max(self.limit - self.synced - self.pending, 0)
+
+
+class QuotaEngine:
+    """
+    Enforces ``user_subscription.product_query_limit`` from memory.
+
+    Each worker keeps a bucket per user, seeded from ``user_subscription`` and
+    ``user_quota`` on first use.  Windows last the package's ``validity_days``
+    and start when the subscription was (re)activated.  Consuming a query is a dict lookup; a
+    background loop ``$inc``s the local usage into ``user_quota`` and reads
+    back the shared total, so workers converge within ``QUOTA_SYNC_INTERVAL``.
+    Across N workers a user can overshoot by at most what the other workers
+    served since their last sync.
+    """
+
+    def __init__(self, window: int = QUOTA_WINDOW_SECONDS, sync_interval: float = QUOTA_SYNC_INTERVAL):
+        self.window = window
+        self.sync_interval = sync_interval
+        self._buckets: dict[ObjectId, QuotaBucket] = {}
+        # Usage left over from a window that rolled before it was synced
+        self._carry: dict[tuple, int] = {}
+        self._task: asyncio.Task | None = None
+
+    @staticmethod
+    def _as_datetime(epoch: int) -> datetime:
+        return datetime.fromtimestamp(epoch, tz=timezone.utc).replace(tzinfo=None)
+
+    @staticmethod
+    def _as_epoch(value: datetime) -> int:
+        # Mongo hands back naive UTC datetimes
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return int(value.timestamp())
+
+    async def _period(self, package_id) -> int:
+        if not ObjectId.is_valid(package_id):
+            return self.window
+        package = await db.subscription_package.find_one(
+            {"_id": ObjectId(package_id)}, projection={"validity_days": 1}
+        )
+        days = (package or {}).get("validity_days")
+        return int(days) * 24 * 3600 if days else self.window
+
+    def _retire(self, user_id: ObjectId, bucket: QuotaBucket) -> None:
+        # Usage of a window that ended before it was synced is written later
+        if bucket.pending:
+            key = (user_id, bucket.window_start)
+            self._carry[key] = self._carry.get(key, 0) + bucket.pending
+            bucket.pending = 0
+
+    async def _load(self, user_id: ObjectId, now: float) -> QuotaBucket:
+        subscription = await db.user_subscription.find_one(
+            {"user_id": user_id},
+            projection={"product_query_limit": 1, "package_id": 1, "created_at": 1, "updated_at": 1},
+        )
+        if subscription:
+            limit = int(subscription.get("product_query_limit") or 0)
+            started = subscription.get("updated_at") or subscription.get("created_at")
+            anchor = self._as_epoch(started) if isinstance(started, datetime) else 0
+            period = await self._period(subscription.get("package_id"))
+        else:
+            limit, anchor, period = QUOTA_DEFAULT_LIMIT, 0, self.window
+
+        fresh = QuotaBucket(limit, anchor, period, 0, 0, now)
+        fresh.window_start = fresh.window_at(now)
+
+        usage = await db.user_quota.find_one(
+            {"user_id": user_id, "window_start": self._as_datetime(fresh.window_start)},
+            projection={"used": 1},
+        )
+        used = usage.get("used", 0) if usage else 0
+
+        # Another request may have created the bucket while we were reading
+        bucket = self._buckets.get(user_id)
+        if bucket is None or bucket.window_start != fresh.window_start:
+            if bucket is not None:
+                self._retire(user_id, bucket)
+            fresh.synced = used
+            bucket = self._buckets[user_id] = fresh
+        else:
+            bucket.limit = limit
+            bucket.anchor, bucket.period = anchor, period
+            bucket.synced = max(bucket.synced, used)
+            bucket.loaded_at = now
+        return bucket
+
+    async def _bucket(self, user_id: ObjectId, now: float) -> QuotaBucket:
+        bucket = self._buckets.get(user_id)
+
+        if bucket is not None and bucket.window_start != bucket.window_at(now):
+            self._retire(user_id, bucket)
+            bucket = None
+
+        if bucket is None or now - bucket.loaded_at > QUOTA_LIMIT_TTL:
+            bucket = await self._load(user_id, now)
+        return bucket
+
+    @staticmethod
+    def _headers(bucket: QuotaBucket) -> dict:
+        if bucket.limit is None:
+            return {}
+        return {
+            "X-Quota-Limit":     str(bucket.limit),
+            "X-Quota-Remaining": str(bucket.remaining),
+            "X-Quota-Reset":     str(bucket.window_start + bucket.period),
+        }
+
+    async def consume(self, user, response: Response | None = None, cost: int = 1) -> int | None:
+        """
+        Take ``cost`` queries from the user's quota or raise 429.
+
+        Quota headers are set on ``response`` when given.  Returns the
+        remaining allowance, or None for users without a limit.
+        """
+        now = time.time()
+        bucket = await self._bucket(ObjectId(user["_id"]), now)
+
+        if bucket.limit is not None and bucket.remaining < cost:
+            headers = self._headers(bucket)
+            headers["Retry-After"] = str(max(int(bucket.window_start + bucket.period - now), 1))
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Product query limit reached",
+                headers=headers,
+            )
+
+        bucket.pending += cost
+        if response is not None:
+            response.headers.update(self._headers(bucket))
+        return bucket.remaining
+
+    def invalidate(self, user_id) -> None:
+        """Re-read the user's limit on their next request, e.g. after a plan change."""
+        bucket = self._buckets.get(ObjectId(user_id))
+        if bucket is not None:
+            bucket.loaded_at = 0
+
+    async def sync(self) -> int:
+        # Swap pending counts out first so queries served during the write
+        # are kept for the next round
+        increments = dict(self._carry)
+        self._carry = {}
+        for user_id, bucket in self._buckets.items():
+            if bucket.pending:
+                key = (user_id, bucket.window_start)
+                increments[key] = increments.get(key, 0) + bucket.pending
+                bucket.pending = 0
+
+        now = datetime.utcnow()
+        if increments:
+            ops = [
+                UpdateOne(
+                    {"user_id": user_id, "window_start": self._as_datetime(window_start)},
+                    {"$inc": {"used": used}, "$set": {"updated_at": now}},
+                    upsert=True,
+                )
+                for (user_id, window_start), used in increments.items()
+            ]
+            try:
+                await db.user_quota.bulk_write(ops, ordered=False)
+            except Exception as exc:
+                # Put the usage back; it is retried on the next sync
+                for (user_id, window_start), used in increments.items():
+                    bucket = self._buckets.get(user_id)
+                    if bucket is not None and bucket.window_start == window_start:
+                        bucket.pending += used
+                    else:
+                        key = (user_id, window_start)
+                        self._carry[key] = self._carry.get(key, 0) + used
+                print(f"user_quota sync failed, retrying next sync: {exc}")
+                return 0
+
+            for (user_id, window_start), used in increments.items():
+                bucket = self._buckets.get(user_id)
+                if bucket is not None and bucket.window_start == window_start:
+                    bucket.synced += used
+
+        # Pull the shared totals, which include the other workers' usage
+        windows = [
+            {"user_id": user_id, "window_start": self._as_datetime(bucket.window_start)}
+            for user_id, bucket in self._buckets.items()
+        ]
+        if windows:
+            cursor = db.user_quota.find(
+                {"$or": windows}, projection={"user_id": 1, "window_start": 1, "used": 1}
+            )
+            try:
+                async for usage in cursor:
+                    bucket = self._buckets.get(usage["user_id"])
+                    if bucket is not None and self._as_datetime(bucket.window_start) == usage["window_start"]:
+                        bucket.synced = usage.get("used", 0)
+            except Exception as exc:
+                print(f"user_quota read failed, keeping local totals: {exc}")
+
+        # Forget users idle for a whole limit TTL with nothing left to write
+        idle_before = time.time() - QUOTA_LIMIT_TTL
+        for user_id in [uid for uid, b in self._buckets.items() if not b.pending and b.loaded_at < idle_before]:
+            del self._buckets[user_id]
+
+        return len(increments)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.sync_interval)
+            await self.sync()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.sync()
+
+
+quota_engine = QuotaEngine()
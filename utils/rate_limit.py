@@ -0,0 +1,312 @@
+import os
+import json
+import time
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import jwt
+from bson import ObjectId
+from jwt.exceptions import InvalidTokenError
+from pymongo import UpdateOne
+
+from database import db
+from utils.cache import TTLCache
+from utils import users as users_utils
+
+from dotenv import load_dotenv
+load_dotenv()
+
+
+RATE_LIMIT_WINDOW = int(os.getenv("RATE_LIMIT_WINDOW", 60))
+# Requests per window for callers without a subscription (and unknown IPs)
+RATE_LIMIT_DEFAULT = int(os.getenv("RATE_LIMIT_DEFAULT", 30))
+# Requests per window by subscription_package.type
+RATE_LIMIT_PACKAGES = {
+    "BASIC":      int(os.getenv("RATE_LIMIT_BASIC", 60)),
+    "PREMIUM":    int(os.getenv("RATE_LIMIT_PREMIUM", 300)),
+    "ENTERPRISE": int(os.getenv("RATE_LIMIT_ENTERPRISE", 1200)),
+}
+# Share counts between workers through the rate_limits collection
+RATE_LIMIT_MONGO_SYNC = os.getenv("RATE_LIMIT_MONGO_SYNC", "0") == "1"
+RATE_LIMIT_SYNC_INTERVAL = float(os.getenv("RATE_LIMIT_SYNC_INTERVAL", 1))
+RATE_LIMIT_PLAN_TTL = int(os.getenv("RATE_LIMIT_PLAN_TTL", 300))
+# How long an unknown app/secret key pair is remembered before it is looked up again
+RATE_LIMIT_UNKNOWN_TTL = int(os.getenv("RATE_LIMIT_UNKNOWN_TTL", 30))
+
+# Admin, static files and the admin login are never limited
+RATE_LIMIT_EXCLUDE = ("/admin", "/assets", "/login", "/auth/login")
+
+SECRET_KEY = os.getenv("SECRET_KEY")
+ALGORITHM = os.getenv("ALGORITHM")
+
+
+class WindowCounter:
+    __slots__ = ("window", "current", "previous", "remote_current", "remote_previous", "pending",
+                 "pending_previous")
+
+    def __init__(self, window: int):
+        self.window = window
+        self.current = 0          # hits in this worker for the current window
+        self.previous = 0
+        self.remote_current = 0   # hits in other workers, as of the last sync
+        self.remote_previous = 0
+        self.pending = 0          # local hits not yet written to Mongo
+        self.pending_previous = 0
+
+    def roll(self, window: int) -> None:
+        if window == self.window:
+            return
+        # Unsynced hits of the window that just ended still count towards the
+        # sliding estimate, so they are written on the next sync
+        if window == self.window + 1:
+            self.previous, self.remote_previous = self.current, self.remote_current
+            self.pending_previous = self.pending
+        else:
+            self.previous = self.remote_previous = self.pending_previous = 0
+        self.current = self.remote_current = self.pending = 0
+        self.window = window
+
+
+class RateLimiter:
+    """
+    Sliding-window counter per caller.
+
+    The estimate weights the previous fixed window by how much of it still
+    overlaps the sliding window, so memory is two counters per caller.  With
+    ``RATE_LIMIT_MONGO_SYNC`` each worker periodically ``$inc``s its counts
+    into ``rate_limits`` and reads back the other workers' share.
+    """
+
+    def __init__(self, period: int = RATE_LIMIT_WINDOW, sync: bool = RATE_LIMIT_MONGO_SYNC):
+        self.period = period
+        self.sync_enabled = sync
+        self._counters: dict[str, WindowCounter] = {}
+        # user _id -> (rate limit key, requests per window); JWT sub -> user _id
+        self._plans = TTLCache(maxsize=10_000, ttl=RATE_LIMIT_PLAN_TTL)
+        # App/secret key pairs with no active user, so bad keys don't hit Mongo on every request
+        self._unknown = TTLCache(maxsize=10_000, ttl=RATE_LIMIT_UNKNOWN_TTL)
+        self._task: asyncio.Task | None = None
+
+    # ── Identity ───────────────────────────────────────────────────
+
+    async def _package_limit(self, user_id) -> int:
+        subscription = await db.user_subscription.find_one(
+            {"user_id": user_id}, projection={"package_id": 1}
+        )
+        if not subscription or not ObjectId.is_valid(subscription.get("package_id")):
+            return RATE_LIMIT_DEFAULT
+
+        package = await db.subscription_package.find_one(
+            {"_id": ObjectId(subscription["package_id"])}, projection={"type": 1}
+        )
+        return RATE_LIMIT_PACKAGES.get((package or {}).get("type"), RATE_LIMIT_DEFAULT)
+
+    async def _user_plan(self, user_id) -> tuple[str, int]:
+        plan = self._plans.get(("user", user_id))
+        if plan is None:
+            plan = (f"user:{user_id}", await self._package_limit(user_id))
+            self._plans.set(("user", user_id), plan)
+        return plan
+
+    async def _sub_plan(self, email: str) -> tuple[str, int] | None:
+        user_id = self._plans.get(("sub", email))
+        if user_id is None:
+            user = await db.User.find_one({"email": email}, projection={"_id": 1})
+            user_id = user["_id"] if user else ""
+            self._plans.set(("sub", email), user_id)
+        return await self._user_plan(user_id) if user_id else None
+
+    async def identify(self, scope) -> tuple[str, int]:
+        headers = dict(scope.get("headers") or [])
+
+        # An app key alone proves nothing; keying on it would let anyone who
+        # knows it spend the owner's limit.  Unverified callers go by JWT or IP.
+        app_key = headers.get(b"app-key", b"").decode("latin-1").strip()
+        secret_key = headers.get(b"secret-key", b"").decode("latin-1").strip()
+        if app_key and secret_key:
+            credentials = (app_key, users_utils.hash_secret(secret_key))
+            if self._unknown.get(credentials) is None:
+                user = await users_utils.lookup_credentials(app_key, secret_key)
+                if user and not user.get("disabled"):
+                    return await self._user_plan(user["_id"])
+                self._unknown.set(credentials, True)
+
+        authorization = headers.get(b"authorization", b"").decode("latin-1")
+        if authorization.lower().startswith("bearer "):
+            try:
+                payload = jwt.decode(authorization[7:].strip(), SECRET_KEY, algorithms=[ALGORITHM])
+            except InvalidTokenError:
+                payload = {}
+            if payload.get("sub"):
+                plan = await self._sub_plan(payload["sub"])
+                if plan:
+                    return plan
+
+        client = scope.get("client")
+        return f"ip:{client[0] if client else 'unknown'}", RATE_LIMIT_DEFAULT
+
+    # ── Counting ───────────────────────────────────────────────────
+
+    def hit(self, key: str, limit: int, now: float | None = None) -> tuple[bool, dict]:
+        """Count one request for ``key``; returns (allowed, rate limit headers)."""
+        now = time.time() if now is None else now
+        window, offset = divmod(now, self.period)
+        window = int(window)
+
+        counter = self._counters.get(key)
+        if counter is None:
+            counter = self._counters[key] = WindowCounter(window)
+        counter.roll(window)
+
+        overlap = 1 - offset / self.period
+        used = (counter.previous + counter.remote_previous) * overlap + counter.current + counter.remote_current
+        reset = int((window + 1) * self.period)
+
+        headers = {
+            "X-RateLimit-Limit": str(limit),
+            "X-RateLimit-Reset": str(reset),
+        }
+        if used + 1 > limit:
+            headers["X-RateLimit-Remaining"] = "0"
+            headers["Retry-After"] = str(max(int(reset - now), 1))
+            return False, headers
+
+        counter.current += 1
+        counter.pending += 1
+        headers["X-RateLimit-Remaining"] = str(max(int(limit - used - 1), 0))
+        return True, headers
+
+    # ── Cross-worker sync ──────────────────────────────────────────
+
+    def _window_start(self, window: int) -> datetime:
+        return datetime.fromtimestamp(window * self.period, tz=timezone.utc).replace(tzinfo=None)
+
+    async def sync(self) -> None:
+        """Drop idle counters and, when enabled, share counts through Mongo."""
+        window = int(time.time() // self.period)
+        # (key, window) -> hits to add; the previous window's catch up after a roll
+        increments = {}
+        for key, counter in list(self._counters.items()):
+            counter.roll(window)
+            if not counter.current and not counter.previous:
+                del self._counters[key]
+            elif self.sync_enabled:
+                if counter.pending:
+                    increments[(key, window)] = counter.pending
+                    counter.pending = 0
+                if counter.pending_previous:
+                    increments[(key, window - 1)] = counter.pending_previous
+                    counter.pending_previous = 0
+
+        # Without Mongo sync the loop only prunes idle callers
+        if not self.sync_enabled:
+            return
+
+        if increments:
+            try:
+                await db.rate_limits.bulk_write([
+                    UpdateOne(
+                        {"key": key, "window_start": self._window_start(counted)},
+                        {
+                            "$inc": {"count": count},
+                            "$setOnInsert": {
+                                "expires_at": self._window_start(counted) + timedelta(seconds=2 * self.period),
+                            },
+                        },
+                        upsert=True,
+                    )
+                    for (key, counted), count in increments.items()
+                ], ordered=False)
+            except Exception as exc:
+                for (key, counted), count in increments.items():
+                    counter = self._counters.get(key)
+                    if counter is None or counter.window != window:
+                        continue
+                    if counted == window:
+                        counter.pending += count
+                    else:
+                        counter.pending_previous += count
+                print(f"rate_limits sync failed, retrying next sync: {exc}")
+                return
+
+        if not self._counters:
+            return
+        start, previous_start = self._window_start(window), self._window_start(window - 1)
+        try:
+            cursor = db.rate_limits.find(
+                {"key": {"$in": list(self._counters)}, "window_start": {"$in": [start, previous_start]}},
+                projection={"key": 1, "window_start": 1, "count": 1},
+            )
+            async for doc in cursor:
+                counter = self._counters.get(doc["key"])
+                if counter is None or counter.window != window:
+                    continue
+                # The shared count holds everything this worker has written
+                if doc["window_start"] == start:
+                    counter.remote_current = max(doc["count"] - (counter.current - counter.pending), 0)
+                else:
+                    counter.remote_previous = max(
+                        doc["count"] - (counter.previous - counter.pending_previous), 0
+                    )
+        except Exception as exc:
+            print(f"rate_limits read failed, keeping local counts: {exc}")
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(RATE_LIMIT_SYNC_INTERVAL)
+            await self.sync()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            await self.sync()
+
+
+rate_limiter = RateLimiter()
+
+
+class RateLimitMiddleware:
+    """Pure ASGI middleware, so limiting a request costs no Request/Response objects."""
+
+    def __init__(self, app, limiter: RateLimiter = rate_limiter, exclude: tuple = RATE_LIMIT_EXCLUDE):
+        self.app = app
+        self.limiter = limiter
+        self.exclude = exclude
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(self.exclude):
+            return await self.app(scope, receive, send)
+
+        key, limit = await self.limiter.identify(scope)
+        allowed, headers = self.limiter.hit(key, limit)
+        raw_headers = [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers.items()]
+
+        if not allowed:
+            body = json.dumps({"detail": "Rate limit exceeded"}).encode()
+            await send({
+                "type": "http.response.start",
+                "status": 429,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    *raw_headers,
+                ],
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": [*message.get("headers", []), *raw_headers]}
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
@@ -0,0 +1,103 @@
+import os
+
+from bson import ObjectId
+
+from database import db
+from utils.cache import TTLCache
+
+from dotenv import load_dotenv
+load_dotenv()
+
+
+PACKAGE_CACHE_TTL = int(os.getenv("PACKAGE_CACHE_TTL", 300))
+
+# The package catalog is tiny and only edited through the admin panel, whose
+# writes clear every cache; other workers catch up within PACKAGE_CACHE_TTL
+package_cache = TTLCache(maxsize=1, ttl=PACKAGE_CACHE_TTL, copies=True)
+
+PACKAGES_PIPELINE = [
+    {"$lookup": {
+        "from": "subscription_features",
+        "localField": "_id",
+        "foreignField": "package_id",
+        "as": "features",
+    }},
+    {"$set": {"features": {"$arrayElemAt": ["$features", 0]}}},
+]
+
+
+def _serialize(package: dict) -> dict:
+    features = package.pop("features", None)
+    package["_id"] = str(package["_id"])
+
+    # Convert ObjectIds to strings for JSON serialization
+    features_dict = {}
+    if features:
+        features_dict = {k: v for k, v in features.items() if k not in ["_id", "package_id"]}
+        features_dict["package_id"] = str(features["package_id"])
+        features_dict["_id"] = str(features["_id"])
+
+    return {"package": package, "features": features_dict}
+
+
+async def get_packages_with_features() -> list[dict]:
+    """All subscription packages with their features, from one $lookup aggregation."""
+    result = package_cache.get("packages")
+    if result is None:
+        packages = await db.subscription_package.aggregate(PACKAGES_PIPELINE).to_list(length=None)
+        result = [_serialize(package) for package in packages]
+        package_cache.set("packages", result)
+    return result
+
+
+def _page_pipeline(query: dict, skip: int, limit: int) -> list[dict]:
+    return [
+        # Match and sort ahead of $facet so they can use an index
+        {"$match": query},
+        {"$sort": {"_id": -1}},
+        {"$facet": {
+            "total": [{"$count": "count"}],
+            "results": [
+                {"$skip": skip},
+                {"$limit": limit},
+                # Some flows store package_id as a string
+                {"$set": {"package_oid": {"$convert": {
+                    "input": "$package_id", "to": "objectId", "onError": None, "onNull": None,
+                }}}},
+                {"$lookup": {
+                    "from": "subscription_package",
+                    "localField": "package_oid",
+                    "foreignField": "_id",
+                    "as": "package",
+                }},
+                {"$project": {"package_oid": 0}},
+                {"$set": {"package": {"$arrayElemAt": ["$package", 0]}}},
+            ],
+        }},
+    ]
+
+
+async def paginate_with_packages(collection, query: dict, skip: int, limit: int) -> tuple[int, list[dict]]:
+    """
+    One page of invoices/payments with their subscription package joined in,
+    plus the total count, from a single aggregation.
+    """
+    facet = await collection.aggregate(_page_pipeline(query, skip, limit)).to_list(length=1)
+    facet = facet[0] if facet else {"total": [], "results": []}
+    total = facet["total"][0]["count"] if facet["total"] else 0
+
+    results = []
+    for doc in facet["results"]:
+        doc["id"] = str(doc.pop("_id"))
+
+        if doc.get("package"):
+            doc["package"]["_id"] = str(doc["package"]["_id"])
+
+        # Convert any other ObjectIds found in the document keys
+        for key, value in doc.items():
+            if isinstance(value, ObjectId):
+                doc[key] = str(value)
+
+        results.append(doc)
+
+    return total, results
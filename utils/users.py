@@ -9,7 +9,6 @@ from fastapi.encoders import jsonable_encoder
 from datetime import datetime, timedelta, timezone, timedelta
 
 import jwt
-from pwdlib import PasswordHash
 from jwt.exceptions import InvalidTokenError
 
 from fastapi import Depends, HTTPException, status
@@ -17,6 +16,9 @@ from fastapi.security import OAuth2PasswordBearer
 
 from database import db
 from models import users as users_models
+from utils.cache import TTLCache
+from utils.metering import api_hit_buffer
+from utils.passwords import password_pool
 
 from dotenv import load_dotenv
 load_dotenv()
@@ -29,7 +31,6 @@ SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES"))
 
-password_hash = PasswordHash.recommended()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 
@@ -59,25 +60,54 @@ def hash_secret(raw_secret: str) -> str:
     return hashlib.sha256(raw_secret.encode()).hexdigest()
 
 
-def verify_password(plain_password, hashed_password):
-    return password_hash.verify(plain_password, hashed_password)
+async def verify_password(plain_password, hashed_password):
+    return await password_pool.verify(plain_password, hashed_password)
 
 
-def get_password_hash(password):
-    return password_hash.hash(password)
+async def get_password_hash(password):
+    return await password_pool.hash(password)
 
 async def get_user(db, email):
     user = await db.User.find_one({'email': email})
     return user
 
-def authenticate_user(user, password):
+async def authenticate_user(user, password):
     if not user:
         return False
-    if not verify_password(password, user['password']):
+    if not await verify_password(password, user['password']):
         return False
     return user
 
 
+USER_CACHE_TTL = int(os.getenv("USER_CACHE_TTL", 30))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", 10_000))
+
+# (token sub, token jti) -> user document
+user_cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL, copies=True)
+# user _id -> user_profile document
+profile_cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL, copies=True)
+
+
+def invalidate_user(email: str) -> None:
+    """Forget cached lookups for every token of a user, e.g. after a password reset."""
+    email = email.lower()
+    user_cache.pop_where(lambda key, user: key[0].lower() == email)
+
+
+def invalidate_user_profile(user_id) -> None:
+    profile_cache.pop(user_id)
+
+
+async def get_user_profile(user_id):
+    profile = profile_cache.get(user_id)
+    if profile is None:
+        profile = await db.user_profile.find_one({"user": user_id})
+        if profile is None:
+            return None
+        profile_cache.set(user_id, profile)
+    return profile
+
+
 def create_access_token(data: dict, expires_delta: timedelta | None = None):
     to_encode = data.copy()
     if expires_delta:
@@ -85,6 +115,8 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
     else:
         expire = datetime.now(timezone.utc) + timedelta(minutes=15)
     to_encode.update({"exp": expire})
+    # Token id, so cached lookups are tied to one issued token
+    to_encode.setdefault("jti", secrets.token_urlsafe(8))
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
@@ -103,9 +135,15 @@ async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)]):
         token_data = users_models.TokenData(email=email)
     except InvalidTokenError:
         raise credentials_exception
-    user = await get_user(db, email=token_data.email)
+
+    cache_key = (token_data.email, payload.get("jti"))
+    user = user_cache.get(cache_key)
     if user is None:
-        raise credentials_exception
+        user = await get_user(db, email=token_data.email)
+        if user is None:
+            raise credentials_exception
+        user_cache.set(cache_key, user)
+
     return user
 
 
@@ -116,17 +154,25 @@ async def get_current_active_user(current_user: Annotated["users_models.User", D
 
 from fastapi import HTTPException, Request
 
-async def find_credentials(request: Request):
-    headers = dict(request.headers)
+CREDENTIAL_CACHE_TTL = int(os.getenv("CREDENTIAL_CACHE_TTL", 60))
+CREDENTIAL_CACHE_SIZE = int(os.getenv("CREDENTIAL_CACHE_SIZE", 10_000))
 
-    app_key = headers.get("app-key")
-    secret_key = headers.get("secret-key")
+# (app_key, sha256(secret)) -> user document
+credential_cache = TTLCache(maxsize=CREDENTIAL_CACHE_SIZE, ttl=CREDENTIAL_CACHE_TTL, copies=True)
 
-    if not app_key or not secret_key:
-        raise HTTPException(401, "Missing API credentials")
 
-    app_key = app_key.strip()
-    secret_key = secret_key.strip()
+def invalidate_user_credentials(user_id) -> None:
+    """Forget cached API credentials for a user, e.g. after key rotation."""
+    credential_cache.pop_where(lambda key, user: user.get("_id") == user_id)
+
+
+async def lookup_credentials(app_key: str, secret_key: str):
+    """User for an app/secret key pair (possibly disabled), or None; active users are cached."""
+    # Never keep the raw secret in memory as a key
+    cache_key = (app_key, hash_secret(secret_key))
+    user = credential_cache.get(cache_key)
+    if user is not None:
+        return user
 
     credential = await db.APICredential.find_one({
         "app_key": app_key,
@@ -134,40 +180,39 @@ async def find_credentials(request: Request):
     })
 
     if not credential:
-        raise HTTPException(401, "Invalid API credentials")
+        return None
 
     user_id = credential.get('user_id')
 
     user = await db.User.find_one({"_id": user_id})
 
+    if user and not user.get("disabled"):
+        credential_cache.set(cache_key, user)
+    return user
+
+
+async def find_credentials(request: Request):
+    headers = dict(request.headers)
+
+    app_key = headers.get("app-key")
+    secret_key = headers.get("secret-key")
+
+    if not app_key or not secret_key:
+        raise HTTPException(401, "Missing API credentials")
+
+    user = await lookup_credentials(app_key.strip(), secret_key.strip())
+
+    if not user:
+        raise HTTPException(401, "Invalid API credentials")
+    if user.get("disabled"):
+        raise HTTPException(400, "Inactive user")
+
     return user
 
 
 async def count_api_hit(endpoint: str, user):
-    # Find existing record
-    count_obj = await db.api_hits.find_one({"endpoint": endpoint, "user_id": user['_id']})
-
-    if not count_obj:
-        # Create new record
-        _count_obj = {
-            "endpoint": endpoint,
-            "user_id": user['_id'],
-            "total_hits": 1,
-            "created_at": datetime.utcnow(),
-            "updated_at": datetime.utcnow()
-        }
-        data = await db.api_hits.insert_one(_count_obj)
-        return data
-
-    # Increment hits
-    data = await db.api_hits.update_one(
-        {"endpoint": endpoint, "user_id": user['_id']},
-        {
-            "$inc": {"total_hits": 1},  # increment by 1
-            "$set": {"updated_at": datetime.utcnow()}
-        }
-    )
-    return data
+    # Buffered in memory and flushed to api_hits in bulk by the app lifespan
+    api_hit_buffer.record(endpoint, user['_id'])
 
 
 